@@ -1,13 +1,94 @@
 
+import os
+import json
+import time
+import base64
+import threading
 import requests
-def authenticate(_: str) -> str:
-    url = "https://bookmesky.com/partner/api/auth/token"
+import Http_Client
+from Tracing import span, count
+
+AUTH_PATH = "/partner/api/auth/token"
+TOKEN_TTL = float(os.getenv("BOOKME_TOKEN_TTL", "3000"))  # used when the token carries no expiry of its own
+REFRESH_MARGIN = float(os.getenv("BOOKME_TOKEN_REFRESH_MARGIN", "60"))  # refresh this many seconds before expiry
+AUTH_FAILURE_BACKOFF = float(os.getenv("BOOKME_AUTH_FAILURE_BACKOFF", "10"))  # seconds a failed login is reused
+
+# Process-wide token cache, shared by the agent tool and search_flights
+_token = ""
+_expires_at = 0.0
+_failed_at = None  # time of the last failed login; callers within the backoff share that failure
+_lock = threading.Lock()
+
+
+def token_expiry(body):
+    for key in ("ExpiresIn", "expires_in"):
+        if body.get(key):
+            return time.time() + float(body[key])
+
+    # Bookme tokens are JWTs, so read the exp claim when it is there
+    parts = (body.get("Token") or "").split(".")
+    if len(parts) == 3:
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+            if claims.get("exp"):
+                return float(claims["exp"])
+        except (ValueError, TypeError):
+            pass
+
+    return time.time() + TOKEN_TTL
+
+
+def request_token():
     headers = {"Content-Type": "application/json"}
     payload = {
-        "username": "Enter your username",
-        "password": " password "
+        "username": os.getenv("BOOKME_USERNAME", "Enter your username"),
+        "password": os.getenv("BOOKME_PASSWORD", " password ")
     }
-    r = requests.post(url, json=payload,headers=headers)
+    try:
+        with span("auth_request"):
+            r = Http_Client.post(AUTH_PATH, json=payload,headers=headers)
+    except requests.RequestException:
+        count("auth_responses", status="network_error")
+        return "", 0.0
+    count("auth_responses", status=r.status_code)
     if r.status_code in [200, 201]:
-        return r.json().get("Token")
-    return " "
+        body = r.json()
+        if body.get("Token"):
+            return body["Token"], token_expiry(body)
+    return "", 0.0
+
+
+def token_is_fresh():
+    return bool(_token) and time.time() < _expires_at - REFRESH_MARGIN
+
+
+def get_token(stale_token=None):
+    # stale_token: a token the caller saw rejected; it is replaced even if it has not expired yet.
+    # Returns "" when Bookme login fails (callers must not search with it).
+    global _token, _expires_at, _failed_at
+    if token_is_fresh() and _token != stale_token:
+        count("token_cache", result="hit")
+        return _token
+
+    with _lock:
+        # Another caller may have refreshed while we were waiting for the lock
+        if token_is_fresh() and _token != stale_token:
+            count("token_cache", result="hit")
+            return _token
+        if _failed_at is not None and time.time() - _failed_at < AUTH_FAILURE_BACKOFF:
+            count("token_cache", result="failed")
+            return ""
+        count("token_cache", result="refresh")
+        _token, _expires_at = request_token()
+        _failed_at = None if _token else time.time()
+        return _token
+
+
+def invalidate_token():
+    global _token, _expires_at, _failed_at
+    with _lock:
+        _token, _expires_at, _failed_at = "", 0.0, None
+
+
+def authenticate(_: str) -> str:
+    return get_token()
@@ -0,0 +1,90 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Batch mode: read JSONL flight requests, run them through a bounded worker pool and stream JSONL results.
+# Every worker shares the process-wide token cache, HTTP pool and search cache.
+#
+# Input lines:  {"id": "1", "query": "karachi to lahore tomorrow 2 adults"}
+#               {"id": "2", "data": {"TripType": "one_way", "source": "Karachi", "destination": "Lahore", "date": "2025-07-12"}}
+# Usage:        python Batch_Runner.py requests.jsonl -o results.jsonl --workers 8
+
+
+def read_requests(stream):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"id": f"line-{line_number}", "invalid": str(e)}
+            continue
+        request.setdefault("id", f"line-{line_number}")
+        yield request
+
+
+def run_one(request, mode=None):
+    from Flight_Pipeline import run_query
+    start = time.perf_counter()
+    if "invalid" in request:
+        result = {"id": request["id"], "status": "error", "message": f"Invalid JSON: {request['invalid']}"}
+    else:
+        try:
+            result = run_query(request, mode=mode)
+        except Exception as e:
+            result = {"id": request.get("id"), "status": "error", "message": str(e)}
+    result.setdefault("timings", {})["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def run_batch(requests_iter, output, workers=4, mode=None):
+    # At most `workers` requests are in flight at once, so arbitrarily large files stream through
+    slots = threading.BoundedSemaphore(workers)
+    write_lock = threading.Lock()
+    summary = {"requests": 0, "ok": 0, "failed": 0}
+
+    def work(request):
+        try:
+            result = run_one(request, mode)
+            with write_lock:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                summary["ok" if result.get("status") == "ok" else "failed"] += 1
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for request in requests_iter:
+            slots.acquire()
+            summary["requests"] += 1
+            executor.submit(work, request)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of flight requests.")
+    parser.add_argument("input", help="JSONL file with one request per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for results ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="requests processed concurrently")
+    parser.add_argument("--mode", choices=["concurrent", "sequential"], default=None, help="provider fan-out mode")
+    args = parser.parse_args()
+
+    load_dotenv()
+    import Http_Client
+    from Flight_Searching_Tool import AVAILABLE_PROVIDERS
+    # Each worker fans out to every provider, so size the shared pool for that
+    Http_Client.POOL_SIZE = max(Http_Client.POOL_SIZE, args.workers * len(AVAILABLE_PROVIDERS))
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    started = time.perf_counter()
+    summary = run_batch(read_requests(source), output, workers=args.workers, mode=args.mode)
+    elapsed = time.perf_counter() - started
+    print(f"{summary['requests']} requests ({summary['ok']} ok, {summary['failed']} failed) in {elapsed:.1f}s",
+          file=sys.stderr)
@@ -1,10 +1,13 @@
+import os
 import json
 import re
+import threading
 from datetime import datetime
-import google.generativeai as genai
 from Date import resolve_date
 from Default_Values import DEFAULTS
 from IATA_Code import CITY_TO_IATA,AIRLINE_NAMES
+from Name_Resolver import resolve_airline, resolve_city
+from Tracing import span, count
 
 def today_str():
     return datetime.today().strftime("%Y-%m-%d")
@@ -14,19 +17,147 @@ def get_today_day_name():
     return today.strftime("%A")
 
 def city_to_iata(city):
-    return CITY_TO_IATA.get(city.strip().lower().replace(" ", "_"))
+    return resolve_city(city)
 
 def validate_airlines(raw_list):
     if not raw_list:
         return []
-    valid_airlines = []
-    for name in raw_list:
-        for key, val in AIRLINE_NAMES.items():
-            if name.strip().lower() in [key.lower(), val.lower()]:
-                valid_airlines.append(val)
-    return list(set(valid_airlines))  # Deduplicate
+    valid_airlines = [resolve_airline(name) for name in raw_list if isinstance(name, str)]
+    return list(set(code for code in valid_airlines if code))  # Deduplicate
+
+TRAVELER_PATTERN = re.compile(r"(\d+)\s*(adult|child|infant)s?")
+
+# Rule-based fast path: simple queries ("karachi to lahore tomorrow 2 adults economy") are parsed
+# locally and only ambiguous ones go to Gemini
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_PARSER", "1") != "0"
+FAST_PATH_STATS = {"hits": 0, "misses": 0}
+FAST_PATH_STATS_LOCK = threading.Lock()  # extractions run on worker, batch and session-server threads
+
+MONTHS = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+DATE_PATTERN = re.compile(
+    r"\b(?:\d{4}-\d{2}-\d{2}"
+    r"|\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?" + MONTHS + r"(?:,?\s+\d{4})?"
+    r"|" + MONTHS + r"\s+\d{1,2}(?:st|nd|rd|th)?(?:,?\s+\d{4})?"
+    r"|(?:in\s+)?\d+\s*(?:day|week|month)s?(?:\s+(?:later|from now))?"
+    r"|today|tomorrow|tommorow|tommorrow|tmrw)\b"
+)
+# "2 weeks later", "in 3 days": relative to an earlier date the rules can't tie it to, so a return date
+# like that goes to Gemini (whose prompt leaves it empty)
+RELATIVE_DATE_PATTERN = re.compile(r"(?:in\s+)?\d+\s*(?:day|week|month)s?(?:\s+(?:later|from now))?")
+CITY_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((c.replace("_", " ") for c in CITY_TO_IATA), key=len, reverse=True)) + r")\b"
+)
+AIRLINE_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(a.lower()) for a in AIRLINE_NAMES), key=len, reverse=True)) + r")\b"
+)
+CLASS_PATTERN = re.compile(r"\b(premium economy|economy|business|first)(?:\s+class)?\b")
+ROUND_TRIP_PATTERN = re.compile(r"\b(?:round[\s-]?trip|return(?:ing)?(?:\s+(?:on|at))?)\b")
+ONE_WAY_PATTERN = re.compile(r"\bone[\s-]?way\b")
+MULTI_CITY_PATTERN = re.compile(r"\bmulti[\s-]?city\b")
+FAST_TRAVELER_PATTERN = re.compile(r"\b(\d+)\s*(adult|child|infant)(?:s|ren)?\b")
+FILLER_WORDS = {
+    "i", "we", "me", "us", "want", "need", "would", "like", "to", "from", "on", "for", "a", "an", "the",
+    "book", "please", "flight", "flights", "ticket", "tickets", "fly", "travel", "trip", "go", "going",
+    "and", "with", "show", "find", "search", "any", "by", "via", "of", "departing", "leaving", "date"
+}
+
+
+def fast_parse(query: str):
+    text = " ".join(query.lower().replace(",", " , ").split())
+    if MULTI_CITY_PATTERN.search(text):
+        return None
+
+    cities = [(m.group(1), m.start()) for m in CITY_PATTERN.finditer(text)]
+    dates = DATE_PATTERN.findall(text)
+    if len(cities) != 2 or cities[0][0] == cities[1][0] or not dates or len(dates) > 2:
+        return None
+
+    # "to lahore from karachi" → respect the prepositions, otherwise take the cities in order
+    (first, first_pos), (second, _) = cities
+    if text[:first_pos].rstrip().endswith(" to") or text[:first_pos].rstrip() == "to":
+        first, second = second, first
+
+    round_trip = bool(ROUND_TRIP_PATTERN.search(text)) or len(dates) == 2
+    if round_trip and ONE_WAY_PATTERN.search(text):
+        return None
+    if round_trip and len(dates) == 2:
+        if RELATIVE_DATE_PATTERN.fullmatch(dates[1]):
+            return None
+        departure, return_date = resolve_date(dates[0]), resolve_date(dates[1])
+        if "Could not" not in departure + return_date and return_date < departure:
+            return None
+
+    travel_class = CLASS_PATTERN.search(text)
+    travelers = FAST_TRAVELER_PATTERN.findall(text)
+    airlines = AIRLINE_PATTERN.findall(text)
+
+    # Only trust the parse when every remaining word is filler; anything else (typos, times, prices) goes to Gemini
+    leftover = text
+    for pattern in (CITY_PATTERN, DATE_PATTERN, AIRLINE_PATTERN, CLASS_PATTERN, ROUND_TRIP_PATTERN,
+                    ONE_WAY_PATTERN, FAST_TRAVELER_PATTERN):
+        leftover = pattern.sub(" ", leftover)
+    if any(word not in FILLER_WORDS for word in re.findall(r"[a-z0-9]+", leftover)):
+        return None
+
+    traveler_counts = {"adult": 0, "child": 0, "infant": 0}
+    for count, kind in travelers:
+        traveler_counts[kind] += int(count)
+
+    return {
+        "TripType": "round_trip" if round_trip else "one_way",
+        "source": first.title(),
+        "destination": second.title(),
+        "date": "" if round_trip else dates[0],
+        "departure_date": dates[0] if round_trip else "",
+        "return_date": dates[-1] if round_trip else "",
+        "flights": [],
+        "TravelClass": travel_class.group(1) if travel_class else "",
+        "Travelers": [{"Type": kind, "Count": n} for kind, n in traveler_counts.items()] if travelers else [],
+        "airline_detected": airlines
+    }
+
+
+# "stub" answers from Stub_Backends instead of Gemini (offline runs and benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+_gemini_model = None
+
+
+def gemini_model():
+    # google.generativeai is slow to import, so it is only loaded for the first query that needs Gemini
+    global _gemini_model
+    if _gemini_model is None:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        _gemini_model = genai.GenerativeModel("models/gemini-1.5-flash-latest")
+    return _gemini_model
+
+
+def generate_content(prompt):
+    if LLM_BACKEND == "stub":
+        from Stub_Backends import stub_reply
+        with span("llm_call", purpose="extract", backend="stub"):
+            return stub_reply(prompt)
+    with span("llm_call", purpose="extract", backend="gemini"):
+        return gemini_model().generate_content(prompt).text
+
+
+def fast_path_stats():
+    with FAST_PATH_STATS_LOCK:
+        stats = dict(FAST_PATH_STATS)
+    total = stats["hits"] + stats["misses"]
+    return dict(stats, hit_rate=stats["hits"] / total if total else 0.0)
+
 
 def extract_flight_details(query: str) -> str:
+    data = fast_parse(query) if FAST_PATH_ENABLED else None
+    with FAST_PATH_STATS_LOCK:
+        FAST_PATH_STATS["hits" if data is not None else "misses"] += 1
+    if data is not None:
+        count("extraction", path="fast")
+        return normalize_details(data)
+    count("extraction", path="llm")
+
     prompt = f"""
     You are a smart flight assistant. Extract only flight booking information. Follow these rules:
 
@@ -98,11 +229,16 @@ def extract_flight_details(query: str) -> str:
     \"\"\"{query}\"\"\"
     """
 
-    response = genai.GenerativeModel("models/gemini-1.5-flash-latest").generate_content(prompt)
-    text = re.sub(r"^```json|```$", "", response.text, flags=re.MULTILINE).strip()
+    text = re.sub(r"^```json|```$", "", generate_content(prompt), flags=re.MULTILINE).strip()
 
     try:
         data = json.loads(text)
+    except Exception as e:
+        return json.dumps({"error": f"Could not parse flight details. {str(e)}"})
+    return normalize_details(data)
+
+def normalize_details(data: dict) -> str:
+    try:
         # Normalize airline_detected to a list
         airline = data.get("airline_detected")
 
@@ -127,7 +263,7 @@ def extract_flight_details(query: str) -> str:
         if all(isinstance(t, str) for t in data["Travelers"]):
             traveler_counts = {"adult": 0, "child": 0, "infant": 0}
             for t in data["Travelers"]:
-                match = re.match(r"(\d+)\s*(adult|child|infant)s?", t.strip().lower())
+                match = TRAVELER_PATTERN.match(t.strip().lower())
                 if match:
                     traveler_counts[match.group(2)] += int(match.group(1))
             data["Travelers"] = [
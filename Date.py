@@ -1,21 +1,41 @@
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+from functools import lru_cache
 import re
-import dateparser
 from dateutil.relativedelta import relativedelta #
-import copy
+
+# resolve_date is called several times per query (once per leg, again on already resolved round-trip dates),
+# so ISO input returns immediately, patterns are compiled once and answers are memoized for the current day.
+# dateparser is only imported for phrases none of the local rules understand.
+
+MEMO_SIZE = 2048
+
+ISO_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+RELATIVE_PATTERN = re.compile(r"(\d+)\s*(day|week|month|year)s?")
+WEEKDAY_PATTERN = re.compile(r"(?:(?:on|this|coming|next)\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)")
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Common typo corrections
+CORRECTIONS = {
+    "tommorow": "tomorrow",
+    "tommorrow": "tomorrow",
+    "todai": "today",
+    "tmrw": "tomorrow"
+}
 
 def resolve_date(text: str) -> str:
     text = text.lower().strip()
-    today = datetime.today().date()
+    if ISO_PATTERN.fullmatch(text):
+        try:
+            date.fromisoformat(text)
+            return text
+        except ValueError:
+            pass
+    # The day is part of the key, so "tomorrow" is never served from yesterday's memo
+    return resolve_relative(text, datetime.today().date())
 
-    # Common typo corrections
-    corrections = {
-        "tommorow": "tomorrow",
-        "tommorrow": "tomorrow",
-        "todai": "today",
-        "tmrw": "tomorrow"
-    }
-    text = corrections.get(text, text)
+@lru_cache(maxsize=MEMO_SIZE)
+def resolve_relative(text: str, today: date) -> str:
+    text = CORRECTIONS.get(text, text)
 
     # Handle direct keywords
     if text == "today":
@@ -23,8 +43,8 @@ def resolve_date(text: str) -> str:
     if text == "tomorrow":
         return (today + timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # Match phrases like "2 weeks 3 days", "1 month and 2 weeks", etc.
-    pattern = re.findall(r"(\d+)\s*(day|week|month|year)s?", text)
+    # Match phrases like "2 weeks 3 days", "1 month and 2 weeks", "3 days after", etc.
+    pattern = RELATIVE_PATTERN.findall(text)
     if pattern:
         result_date = today
         for value, unit in pattern:
@@ -39,24 +59,17 @@ def resolve_date(text: str) -> str:
                 result_date += relativedelta(years=value)
         return result_date.strftime("%Y-%m-%d")
 
-    # Match patterns like "3 days after", "2 weeks later"
-    match = re.search(r"(\d+)\s+(day|week|month|year)s?\s+(after|later|from now)", text)
+    # "friday", "this sunday", "next monday" → the next such day after today (what dateparser gives for "friday")
+    match = WEEKDAY_PATTERN.fullmatch(text)
     if match:
-        value = int(match.group(1))
-        unit = match.group(2)
-        if unit == "day":
-            return (today + timedelta(days=value)).strftime("%Y-%m-%d")
-        elif unit == "week":
-            return (today + timedelta(weeks=value)).strftime("%Y-%m-%d")
-        elif unit == "month":
-            return (today + relativedelta(months=value)).strftime("%Y-%m-%d")
-        elif unit == "year":
-            return (today + relativedelta(years=value)).strftime("%Y-%m-%d")
+        days_ahead = (WEEKDAYS.index(match.group(1)) - today.weekday() - 1) % 7 + 1
+        return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
 
     # Fallback to dateparser
-    parsed = dateparser.parse(text, settings={'PREFER_DATES_FROM': 'future'})
+    import dateparser
+    parsed = dateparser.parse(text, settings={'PREFER_DATES_FROM': 'future',
+                                              'RELATIVE_BASE': datetime.combine(today, datetime.min.time())})
     if parsed:
         return parsed.date().strftime('%Y-%m-%d')
 
     return "Could not resolve the date."
-
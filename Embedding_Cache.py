@@ -0,0 +1,112 @@
+import os
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from Tracing import span, count
+
+# Content-hash keyed cache around the Gemini embedding model (memory LRU + on-disk sqlite).
+# Cache misses from embed_documents are sent to the remote model in batches instead of one call per text.
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")  # empty → memory only
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+
+
+def normalize_text(text):
+    # Case and whitespace differences don't change what the user asked for
+    return " ".join(text.lower().split())
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, model, namespace="", directory=EMBEDDING_CACHE_DIR,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES, batch_size=EMBEDDING_BATCH_SIZE):
+        self.model = model
+        self.namespace = namespace or getattr(model, "model", type(model).__name__)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "remote_calls": 0}
+
+        self.conn = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(os.path.join(directory, "embeddings.sqlite"), check_same_thread=False)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    def key(self, kind, text):
+        return hashlib.sha256(f"{self.namespace}|{kind}|{normalize_text(text)}".encode()).hexdigest()
+
+    def lookup(self, key):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.counters["hits"] += 1
+                count("embedding_cache", result="hit")
+                return vector
+            row = self.conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone() if self.conn else None
+            if row is None:
+                self.counters["misses"] += 1
+                count("embedding_cache", result="miss")
+                return None
+            self.counters["disk_hits"] += 1
+            count("embedding_cache", result="disk_hit")
+            vector = array.array("f", row[0]).tolist()
+            self.remember(key, vector)
+            return vector
+
+    def remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def store(self, items):
+        with self.lock:
+            for key, vector in items:
+                self.remember(key, vector)
+            if self.conn:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                        [(key, array.array("f", vector).tobytes()) for key, vector in items]
+                    )
+
+    def embed_documents(self, texts):
+        keys = [self.key("document", text) for text in texts]
+        vectors = [self.lookup(key) for key in keys]
+
+        resolved = {key: vector for key, vector in zip(keys, vectors) if vector is not None}
+
+        # Deduplicate misses, then embed them remotely in batches
+        missing = list(OrderedDict((key, text) for key, text in zip(keys, texts) if key not in resolved).items())
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            with span("embedding_call", kind="documents"):
+                embedded = self.model.embed_documents([text for _, text in batch])
+            with self.lock:
+                self.counters["remote_calls"] += 1
+            pairs = [(key, vector) for (key, _), vector in zip(batch, embedded)]
+            self.store(pairs)
+            resolved.update(pairs)
+
+        return [resolved[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self.key("query", text)
+        vector = self.lookup(key)
+        if vector is None:
+            with span("embedding_call", kind="query"):
+                vector = self.model.embed_query(text)
+            with self.lock:
+                self.counters["remote_calls"] += 1
+            self.store([(key, vector)])
+        return vector
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.memory))
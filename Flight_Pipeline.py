@@ -0,0 +1,126 @@
+import re
+import json
+import time
+import logging
+from contextlib import contextmanager
+from dataclasses import asdict
+from Data_Extraction_tool import extract_flight_details
+from Authentication_Tool import get_token
+from Flight_Searching_Tool import iter_search_records, search_fare_calendar
+from Flight_Records import SearchOutcome
+from Tracing import span
+
+# Extraction → cached token → search, without the agent loop. Used by main_agent for well-formed
+# queries and by the batch runner. Stage latencies are logged to the "flight_pipeline" logger.
+
+logger = logging.getLogger("flight_pipeline")
+
+CALENDAR_DAYS = 3  # default window for "around 12 July" style queries
+WINDOW_PATTERN = re.compile(r"(?:±|\+/-|\+-)\s*(\d+)\s*days?|(\d+)\s*days?\s+(?:either side|before or after)")
+FLEXIBLE_PATTERN = re.compile(r"\b(?:around|flexible|give or take|near)\b")
+
+
+def flexible_days(query):
+    # Size of the fare-calendar window a query asks for, 0 for an exact-date search
+    text = query.lower()
+    match = WINDOW_PATTERN.search(text)
+    if match:
+        return int(match.group(1) or match.group(2))
+    return CALENDAR_DAYS if FLEXIBLE_PATTERN.search(text) else 0
+
+
+@contextmanager
+def stage(name, timings):
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        timings[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info("stage=%s latency_ms=%.2f", name, timings[f"{name}_ms"])
+
+
+def search_input(details, token=""):
+    # Shape extraction output the way search_flights expects it
+    return {"token": token, "airline": details.get("airline_detected", []), "data": details}
+
+
+def missing_fields(details):
+    # Required fields depend on the trip type (the extractor returns TripType "return" for round trips)
+    trip_type = (details.get("TripType") or "one_way").lower()
+    if trip_type == "multi_city":
+        return [] if len(details.get("Locations") or []) >= 4 else ["flights"]
+    if trip_type in ["round_trip", "return"]:
+        required = ["source", "destination", "departure_date"]
+    else:
+        required = ["source", "destination", "date"]
+    return [field for field in required if not (details.get(field) or "").strip()]
+
+
+def search_details(details, mode=None, on_result=None, timings=None):
+    # Cached token + search for already extracted details; on_result is called per provider as it answers
+    timings = timings if timings is not None else {}
+    with stage("auth", timings):
+        token = get_token()
+
+    outcome = SearchOutcome()
+    with stage("search", timings):
+        for result in iter_search_records(search_input(details, token), mode=mode, outcome=outcome):
+            if on_result:
+                on_result(result)
+    return outcome, timings
+
+
+def calendar_details(details, days, mode=None, timings=None):
+    timings = timings if timings is not None else {}
+    with stage("auth", timings):
+        token = get_token()
+    with stage("calendar", timings):
+        calendar = search_fare_calendar(search_input(details, token), days, mode=mode)
+    return calendar, timings
+
+
+def run_query(request, mode=None):
+    # request: {"query": "natural language"} or {"data": {...extracted details...}}; returns a JSON-ready dict
+    timings = {}
+    result = {"id": request.get("id")}
+
+    with stage("extract", timings):
+        if request.get("data"):
+            details = dict(request["data"])
+            if request.get("airline") and not details.get("airline_detected"):
+                details["airline_detected"] = request["airline"]
+        else:
+            details = json.loads(extract_flight_details(request.get("query", "")))
+
+    if "error" in details or "message" in details:
+        result.update(status="error" if "error" in details else "incomplete",
+                      message=details.get("error") or details.get("message"), timings=timings)
+        return result
+
+    # Pre-structured requests skip the extractor's checks, so incomplete ones are caught here
+    missing = missing_fields(details)
+    if missing:
+        result.update(status="incomplete", message=f"Missing required details: {', '.join(missing)}",
+                      missing=missing, timings=timings)
+        return result
+
+    outcome, _ = search_details(details, mode=mode, timings=timings)
+
+    prices = [itinerary.min_price for itinerary in outcome.itineraries if itinerary.min_price is not None]
+    if outcome.legs:
+        # Leg-by-leg multi-city search: the fare is that of the cheapest stitched journey
+        prices = [journey.price for journey in outcome.journeys]
+        result.update(journeys=[{"price": journey.price, **asdict(journey)} for journey in outcome.journeys],
+                      missing_legs=outcome.missing_legs)
+    result.update(
+        status="ok",
+        found=outcome.found,
+        details=details,
+        min_fare=min(prices, default=None),
+        providers=[{"provider": r.provider, "status": r.status, **({"error": r.error} if r.error else {}),
+                    "itineraries": [asdict(itinerary) for itinerary in r.itineraries]}
+                   for r in outcome.providers],
+        timings=timings
+    )
+    return result
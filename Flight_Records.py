@@ -0,0 +1,236 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from Name_Resolver import resolve_airline
+
+# Compact typed records for search results. The search layer returns these and text is only
+# rendered at the edge (CLI / agent), so stored results can be filtered locally without re-parsing strings.
+
+AUTH_FAILED_MESSAGE = "Could not sign in to Bookme, so no search was made. Please try again shortly."
+
+
+@dataclass(slots=True)
+class Fare:
+    name: str
+    price: float
+
+
+@dataclass(slots=True)
+class Segment:
+    carrier: str
+    carrier_code: str
+    origin: str
+    destination: str
+    departure: str  # ISO timestamp as returned by Bookme
+    arrival: str
+    fares: list = field(default_factory=list)
+
+    @property
+    def min_price(self):
+        return min((fare.price for fare in self.fares), default=None)
+
+
+@dataclass(slots=True)
+class Itinerary:
+    provider: str
+    segments: list = field(default_factory=list)
+
+    @property
+    def min_price(self):
+        prices = [segment.min_price for segment in self.segments if segment.min_price is not None]
+        return min(prices, default=None)
+
+
+@dataclass(slots=True)
+class Journey:
+    legs: list = field(default_factory=list)  # one Itinerary per multi-city leg
+
+    @property
+    def price(self):
+        return sum(itinerary.min_price for itinerary in self.legs)
+
+
+@dataclass(slots=True)
+class ProviderResult:
+    provider: str
+    itineraries: list = field(default_factory=list)
+    status: str = "ok"  # "ok", "timed_out", "unavailable" (circuit breaker open), "auth_failed" or "error"
+    error: str = ""
+
+
+@dataclass(slots=True)
+class SearchOutcome:
+    providers: list = field(default_factory=list)
+    same_day_return: bool = False
+    no_service: bool = False  # no provider serves the route (see Route_Index.py)
+    legs: list = field(default_factory=list)  # "KHI → LHE on 2025-07-12" per leg of a leg-by-leg multi-city search
+    missing_legs: list = field(default_factory=list)  # legs without any flights
+    journeys: list = field(default_factory=list)  # cheapest stitched combinations (see Multi_City.py)
+
+    @property
+    def found(self):
+        return any(itinerary.segments for result in self.providers for itinerary in result.itineraries)
+
+    @property
+    def itineraries(self):
+        return [itinerary for result in self.providers for itinerary in result.itineraries]
+
+
+def parse_itineraries(data, provider):
+    itineraries = []
+    for itinerary in data.get("Itineraries") or []:
+        segments = []
+        for flight in itinerary["Flights"]:
+            carrier_name = flight["MarketingCarrier"]["name"]
+            segments.append(Segment(
+                carrier=carrier_name,
+                carrier_code=resolve_airline(carrier_name),
+                origin=flight["From"]["city"]["name"],
+                destination=flight["To"]["city"]["name"],
+                departure=flight["DepartureAt"],
+                arrival=flight["ArrivalAt"],
+                fares=[Fare(fare["Name"], fare["ChargedTotalPrice"]) for fare in flight.get("Fares", [])]
+            ))
+        itineraries.append(Itinerary(provider, segments))
+    return itineraries
+
+
+# ---------- rendering ----------
+
+def format_time(value):
+    try:
+        return datetime.fromisoformat(value).strftime("%I:%M %p, %d %b %Y")
+    except:
+        return value
+
+
+def render_segment(segment):
+    output = [f"\n{segment.carrier.title()} flight from {segment.origin} to {segment.destination}",
+              f"   Departure: {format_time(segment.departure)} | Arrival: {format_time(segment.arrival)}"]
+    for fare in segment.fares:
+        output.append(f"   Fare: {fare.name.upper()} - PKR {fare.price}")
+    return output
+
+
+def render_provider(provider, itineraries):
+    output = []
+    for itinerary in itineraries:
+        for segment in itinerary.segments:
+            output.extend(render_segment(segment))
+
+    if output:
+        header = f"\n-------------------------------------------------------\n Available Flights from {provider.title()}:\n"
+        return header + "\n".join(output)
+    return ""
+
+
+def render_provider_result(result):
+    if result.status == "auth_failed":
+        return ""  # reported once in the verdict
+    if result.status == "timed_out":
+        return f"\n{result.provider.title()} timed out, results from this provider are not included."
+    if result.status == "unavailable":
+        return f"\n{result.provider.title()} is failing repeatedly and was skipped, results from this provider are not included."
+    if result.status == "error":
+        return f"Error while connecting to {result.provider.title()}: {result.error}"
+    return render_provider(result.provider, result.itineraries)
+
+
+def render_verdict(outcome):
+    # Closing line once every provider has answered ("" when there is nothing to add)
+    if outcome.no_service:
+        return "No airline currently serves this route"
+    if outcome.providers and all(result.status == "auth_failed" for result in outcome.providers):
+        return AUTH_FAILED_MESSAGE
+    if not outcome.found:
+        return "No Flight Found for the given route"
+    if outcome.legs:
+        return render_journeys(outcome)
+    if outcome.same_day_return:
+        return "\n\nYou can also check flights on other return dates."
+    return ""
+
+
+def render_journeys(outcome):
+    lines = []
+    if outcome.journeys:
+        lines.append("\n-------------------------------------------------------\n Cheapest multi-city combinations:")
+        for rank, journey in enumerate(outcome.journeys, 1):
+            lines.append(f"\n{rank}. Total PKR {journey.price}")
+            for itinerary in journey.legs:
+                first, last = itinerary.segments[0], itinerary.segments[-1]
+                lines.append(f"   {first.origin} to {last.destination}: {first.carrier.title()}, "
+                             f"{format_time(first.departure)} - {format_time(last.arrival)}, from PKR {itinerary.min_price}")
+    if outcome.missing_legs:
+        lines.append(f"\nNo flights found for: {'; '.join(outcome.missing_legs)}. Showing the legs that were found.")
+    elif not outcome.journeys:
+        lines.append("\nNo combination of these flights leaves enough connection time between legs.")
+    return "\n".join(lines)
+
+
+def render_search(outcome):
+    if not outcome.found:
+        return render_verdict(outcome)
+
+    final_output = "\n".join(text for text in map(render_provider_result, outcome.providers) if text)
+    return final_output + render_verdict(outcome)
+
+
+def render_ranked(itineraries):
+    # Numbered in the given order (e.g. cheapest first) across providers, instead of grouped by provider
+    output = []
+    for rank, itinerary in enumerate(itineraries, 1):
+        output.append(f"\n-------------------------------------------------------\n {rank}. {itinerary.provider.title()}"
+                      f" - from PKR {itinerary.min_price}")
+        for segment in itinerary.segments:
+            output.extend(render_segment(segment))
+    return "\n".join(output)
+
+
+def render_fare_calendar(calendar):
+    if calendar.get("error"):
+        return calendar["error"]
+    if not calendar.get("cheapest"):
+        return "No Flight Found for the given dates"
+
+    providers = calendar["providers"]
+    lines = ["\n Cheapest fares (PKR) by date:\n", "Date         " + "".join(f"{p.title():>12}" for p in providers)]
+    for day, row in zip(calendar["dates"], calendar["fares"]):
+        lines.append(f"{day}   " + "".join(f"{price if price is not None else '-':>12}" for price in row))
+
+    cheapest = calendar["cheapest"]
+    lines.append(f"\nCheapest: PKR {cheapest['fare']} with {cheapest['provider'].title()} on {cheapest['date']}")
+    if calendar.get("timed_out"):
+        lines.append(f"{len(calendar['timed_out'])} provider/date searches timed out and are not included.")
+    return "\n".join(lines)
+
+
+# ---------- compact storage form (nested lists, used for FAISS metadata) ----------
+
+def to_compact(itineraries):
+    return [
+        [itinerary.provider, [
+            [s.carrier, s.carrier_code, s.origin, s.destination, s.departure, s.arrival,
+             [[fare.name, fare.price] for fare in s.fares]]
+            for s in itinerary.segments
+        ]]
+        for itinerary in itineraries
+    ]
+
+
+def from_compact(rows):
+    return [
+        Itinerary(provider, [
+            Segment(carrier, code, origin, destination, departure, arrival, [Fare(name, price) for name, price in fares])
+            for carrier, code, origin, destination, departure, arrival, fares in segments
+        ])
+        for provider, segments in rows
+    ]
+
+
+def render_itineraries(itineraries):
+    # Group by provider (keeping first-seen order) and render like a fresh search
+    by_provider = {}
+    for itinerary in itineraries:
+        by_provider.setdefault(itinerary.provider, []).append(itinerary)
+    outcome = SearchOutcome([ProviderResult(provider, group) for provider, group in by_provider.items()])
+    return render_search(outcome)
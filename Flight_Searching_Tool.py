@@ -1,20 +1,360 @@
+import os
+import copy
 import json
+import time
 import requests
-from IATA_Code import CITY_TO_IATA, get_airline_code
-from datetime import datetime
-from Data_Extraction_tool import extract_flight_details
+import Http_Client
+from Authentication_Tool import get_token
+from Search_Cache import search_cache, single_flight, cache_key
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from Name_Resolver import resolve_airline, resolve_city
+from datetime import date, timedelta
+from Tracing import span, count
+from Provider_Health import provider_health
+from Route_Index import route_index, route_key, class_key, dates_key
+from Multi_City import MULTI_CITY_MODE, MULTI_CITY_MAX_WORKERS, split_legs, stitch
+from Flight_Records import (SearchOutcome, ProviderResult, parse_itineraries, render_search,
+                            render_provider_result, render_verdict, render_fare_calendar, AUTH_FAILED_MESSAGE)
+
+SEARCH_PATH = "/air/api/search"
+AVAILABLE_PROVIDERS = ["sereneair", "airblue", "airsial", "amadeus", "oneapi"]
+
+# Fan-out settings: "concurrent" queries every provider at once, "sequential" keeps the old one-by-one loop
+SEARCH_MODE = os.getenv("SEARCH_MODE", "concurrent")
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "15"))  # seconds per provider request
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "20"))  # seconds for the whole search
+
+CALENDAR_MAX_WORKERS = int(os.getenv("CALENDAR_MAX_WORKERS", "20"))  # concurrent requests for a fare calendar
+
+TIMED_OUT = "timed_out"
+UNAUTHORIZED = "unauthorized"
+UNAVAILABLE = "unavailable"
+
+class HttpStatusError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
 
 def city_to_iata(city_name):
-    return CITY_TO_IATA.get(city_name.lower().replace(" ", "_"))
+    return resolve_city(city_name)
+
+def post_search(payload, headers, timeout):
+    provider = payload.get("ContentProvider")
+    with span("provider_http", provider=provider):
+        response = Http_Client.post(SEARCH_PATH, headers=headers, json=payload, timeout=timeout)
+    count("provider_responses", provider=provider, status=response.status_code)
+    if response.status_code == 401:
+        return UNAUTHORIZED
+    if response.status_code != 200:
+        return HttpStatusError(response.status_code)
+    return response.json()
+
+def fetch_provider(payload, headers, timeout):
+    key = cache_key(payload)
+    cached = search_cache.get(key)
+    count("search_cache", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return cached
+
+    # Concurrent identical searches (e.g. many sessions on a popular route) send one request between them
+    return single_flight.run(key, lambda: fetch_upstream(key, payload, headers, timeout), timeout, TIMED_OUT)
+
+def fetch_upstream(key, payload, headers, timeout):
+    provider = payload.get("ContentProvider")
+    if not provider_health.allow(provider):
+        count("provider_skipped", provider=provider, reason="circuit_open")
+        return UNAVAILABLE
+
+    start = time.monotonic()
+    try:
+        data = post_search(payload, headers, timeout)
+    except requests.Timeout:
+        provider_health.record_failure(provider)
+        return TIMED_OUT
+    except requests.exceptions.JSONDecodeError as e:
+        # A 200 that isn't JSON (e.g. an HTML error page) is the provider failing
+        provider_health.record_failure(provider)
+        return ValueError(f"Malformed response: {e}")
+    except requests.RequestException as e:
+        provider_health.record_failure(provider)
+        return e
+    except Exception as e:
+        provider_health.release(provider)
+        return e
+
+    if data == UNAUTHORIZED or isinstance(data, HttpStatusError):
+        if isinstance(data, HttpStatusError) and (data.status >= 500 or data.status == 429):
+            # Only server-side failures (after Http_Client's retries) count towards the circuit breaker
+            provider_health.record_failure(provider)
+        else:
+            # A 401/4xx is caused by the request, and one user's bad payload must not open it for everyone
+            provider_health.release(provider)
+        return data
+
+    # Only a response that parses counts as healthy, and one that doesn't is never cached,
+    # or the same search would fail until it expires
+    try:
+        parse_itineraries(data, provider)
+    except Exception as e:
+        provider_health.record_failure(provider)
+        return ValueError(f"Malformed response: {e}")
+    provider_health.record_success(provider, time.monotonic() - start)
+    route_index.record(route_key(payload), provider, bool(data.get("Itineraries")), class_key(payload),
+                       dates_key(payload))
+    search_cache.put(key, data)
+    return data
+
+def search_headers(token):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+def to_provider_result(provider, data):
+    if data is None:
+        return None
+    if data == UNAUTHORIZED:
+        return ProviderResult(provider, status="auth_failed")
+    if data == TIMED_OUT:
+        return ProviderResult(provider, status="timed_out")
+    if data == UNAVAILABLE:
+        return ProviderResult(provider, status="unavailable")
+    if isinstance(data, Exception):
+        return ProviderResult(provider, status="error", error=str(data))
+    # One provider's bad payload is that provider's error, not the whole search's
+    try:
+        return ProviderResult(provider, parse_itineraries(data, provider))
+    except Exception as e:
+        return ProviderResult(provider, status="error", error=f"Malformed response: {e}")
+
+def stream_payloads(payloads, token, mode=None, provider_timeout=None, deadline=None, max_workers=None):
+    # payloads: [(key, payload), ...]; yields (key, ProviderResult) as soon as each response arrives
+    mode = mode or SEARCH_MODE
+    provider_timeout = provider_timeout or PROVIDER_TIMEOUT
+    deadline = deadline or SEARCH_DEADLINE
+    headers = search_headers(token)
+
+    # No token (Bookme login failed): report it instead of searching with an empty bearer token
+    if not token:
+        for key, payload in payloads:
+            yield key, ProviderResult(payload["ContentProvider"], status="auth_failed")
+        return
+
+    def retry_headers():
+        # Expired or revoked token: concurrent 401s share a single re-authentication (or its failure)
+        fresh = get_token(stale_token=token)
+        return search_headers(fresh) if fresh else None
+
+    if mode == "sequential" or len(payloads) <= 1:
+        for key, payload in payloads:
+            data = fetch_provider(payload, headers, provider_timeout)
+            if data == UNAUTHORIZED:
+                retry = retry_headers()
+                if retry is not None:
+                    data = fetch_provider(payload, retry, provider_timeout)
+            result = to_provider_result(payload["ContentProvider"], data)
+            if result:
+                yield key, result
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(len(payloads), max_workers or len(payloads)))
+    futures = {executor.submit(fetch_provider, payload, headers, provider_timeout): (key, payload, False)
+               for key, payload in payloads}
+    end = time.monotonic() + deadline
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=max(end - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                key, payload, retried = futures[future]
+                data = future.result()
+                retry = retry_headers() if data == UNAUTHORIZED and not retried else None
+                if retry is not None:
+                    retry = executor.submit(fetch_provider, payload, retry, provider_timeout)
+                    futures[retry] = (key, payload, True)
+                    pending.add(retry)
+                    continue
+                result = to_provider_result(payload["ContentProvider"], data)
+                if result:
+                    yield key, result
+
+        # Don't wait for stragglers: anything still running past the deadline is reported as timed out
+        for future in pending:
+            key, payload, _ = futures[future]
+            yield key, ProviderResult(payload["ContentProvider"], status="timed_out")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def search_flights(input_dict, mode=None, provider_timeout=None, deadline=None):
+    if isinstance(input_dict, str):
+        input_dict = json.loads(input_dict)
+    # "flexible_days": N turns the search into a cheapest-fare calendar over ±N days
+    if int(input_dict.get("flexible_days") or 0) > 0:
+        calendar = search_fare_calendar(input_dict, int(input_dict["flexible_days"]), mode, provider_timeout, deadline)
+        return render_fare_calendar(calendar)
+    return render_search(search_flight_records(input_dict, mode, provider_timeout, deadline))
+
+def shift_dates(input_dict, offset):
+    # Copy of the search input with every travel date moved by `offset` days; None if a date isn't ISO
+    shifted = copy.deepcopy(input_dict)
+    flight_data = shifted.get("data", shifted)
+    for key in ("departure_date", "return_date"):
+        if key in shifted and shifted is not flight_data:
+            flight_data[key] = shifted.pop(key)
+    try:
+        for key in ("date", "departure_date", "return_date"):
+            if flight_data.get(key):
+                flight_data[key] = (date.fromisoformat(flight_data[key]) + timedelta(days=offset)).isoformat()
+        if flight_data.get("TravelingDates"):
+            flight_data["TravelingDates"] = [(date.fromisoformat(d) + timedelta(days=offset)).isoformat()
+                                             for d in flight_data["TravelingDates"]]
+    except ValueError:
+        return None
+    return shifted
+
+def first_travel_date(input_dict):
+    flight_data = input_dict.get("data", input_dict)
+    for value in (flight_data.get("date"), flight_data.get("departure_date"), *(flight_data.get("TravelingDates") or [])):
+        if value:
+            return value
+    return ""
+
+def search_fare_calendar(input_dict, days=3, mode=None, provider_timeout=None, deadline=None):
+    # Cheapest fare per day and provider over ±days around the requested date. Every provider×date
+    # request runs concurrently and goes through the result cache, so overlapping windows are cheap.
+    if isinstance(input_dict, str):
+        input_dict = json.loads(input_dict)
+
+    today = date.today().isoformat()
+    plans = []
+    for offset in range(-days, days + 1):
+        shifted = shift_dates(input_dict, offset)
+        if shifted is None:
+            return {"error": "Fare calendar needs travel dates in YYYY-MM-DD format."}
+        day = first_travel_date(shifted)
+        if day and day >= today:
+            plans.append((day, shifted))
+
+    token = (input_dict.get("token") or "").strip() or get_token()
+    payloads = []
+    providers = []
+    for day, shifted in plans:
+        shifted["token"] = token
+        for provider, payload in plan_search(shifted)[0]:
+            payloads.append(((day, provider), payload))
+            if provider not in providers:
+                providers.append(provider)
+
+    fares = {}
+    timed_out = []
+    answered = auth_failed = 0
+    for (day, provider), result in stream_payloads(payloads, token, mode, provider_timeout, deadline,
+                                                    max_workers=CALENDAR_MAX_WORKERS):
+        answered += 1
+        if result.status == "auth_failed":
+            auth_failed += 1
+        if result.status == "timed_out":
+            timed_out.append([day, provider])
+        prices = [itinerary.min_price for itinerary in result.itineraries if itinerary.min_price is not None]
+        if prices:
+            fares[(day, provider)] = min(prices)
+
+    # Same answer as search_flights when the Bookme login failed, rather than "no flights"
+    if answered and auth_failed == answered:
+        return {"error": AUTH_FAILED_MESSAGE}
+
+    dates = [day for day, _ in plans]
+    matrix = [[fares.get((day, provider)) for provider in providers] for day in dates]
+    cheapest = min(((price, day, provider) for (day, provider), price in fares.items()), default=None)
+    return {
+        "dates": dates,
+        "providers": providers,
+        "fares": matrix,
+        "cheapest": {"date": cheapest[1], "provider": cheapest[2], "fare": cheapest[0]} if cheapest else None,
+        "timed_out": timed_out
+    }
+
+def search_flight_records(input_dict, mode=None, provider_timeout=None, deadline=None):
+    outcome = SearchOutcome()
+    for _ in iter_search_records(input_dict, mode, provider_timeout, deadline, outcome=outcome):
+        pass
+    return outcome
+
+def iter_search_flights(input_dict, mode=None, provider_timeout=None, deadline=None):
+    # Streaming variant of search_flights: yields each provider's text as it arrives, the verdict last
+    outcome = SearchOutcome()
+    for result in iter_search_records(input_dict, mode, provider_timeout, deadline, outcome=outcome):
+        text = render_provider_result(result)
+        if text:
+            yield text
+    verdict = render_verdict(outcome)
+    if verdict:
+        yield verdict
+
+def iter_search_records(input_dict, mode=None, provider_timeout=None, deadline=None, outcome=None):
+    # Yields ProviderResults as providers answer; the optional outcome is filled in along the way
+    # and left in the original provider order once the search completes
+    outcome = outcome if outcome is not None else SearchOutcome()
+    if isinstance(input_dict, str):
+        input_dict = json.loads(input_dict)
+    if MULTI_CITY_MODE == "legs" and input_dict.get("data", input_dict).get("TripType") == "multi_city":
+        yield from iter_leg_records(input_dict, mode, provider_timeout, deadline, outcome)
+        return
 
-def search_flights(input_dict):
-    global dep_date, ret_date
+    payloads, token, outcome.same_day_return, outcome.no_service = plan_search(input_dict)
 
+    for _, result in stream_payloads(payloads, token, mode, provider_timeout, deadline):
+        outcome.providers.append(result)
+        yield result
+
+    order = {provider: i for i, (provider, _) in enumerate(payloads)}
+    outcome.providers.sort(key=lambda result: order[result.provider])
+
+def iter_leg_records(input_dict, mode=None, provider_timeout=None, deadline=None, outcome=None):
+    # Multi-city trip as one one-way search per leg, all legs × providers at once (see Multi_City.py);
+    # outcome.journeys gets the cheapest feasible combinations, outcome.missing_legs the legs without flights
+    flight_data = input_dict.get("data", input_dict)
+    legs = split_legs(flight_data)
+    token = (input_dict.get("token") or "").strip()
+    payloads = []
+    unserved = 0
+    for i, (origin, destination, day) in enumerate(legs):
+        leg_data = {"TripType": "one_way", "source": origin, "destination": destination, "date": day,
+                    "TravelClass": flight_data.get("TravelClass", "economy")}
+        if flight_data.get("Travelers"):
+            leg_data["Travelers"] = flight_data["Travelers"]
+        leg_payloads, token, _, no_service = plan_search({"token": token, "airline": input_dict.get("airline", []),
+                                                          "data": leg_data})
+        unserved += no_service
+        payloads.extend(((i, provider), payload) for provider, payload in leg_payloads)
+
+    outcome.legs = [f"{origin} → {destination} on {day}" for origin, destination, day in legs]
+    outcome.no_service = bool(legs) and unserved == len(legs)
+    answered = []
+    for key, result in stream_payloads(payloads, token, mode, provider_timeout, deadline,
+                                       max_workers=MULTI_CITY_MAX_WORKERS):
+        answered.append((key, result))
+        yield result
+
+    order = {key: n for n, (key, _) in enumerate(payloads)}
+    answered.sort(key=lambda item: order[item[0]])
+    outcome.providers[:] = [result for _, result in answered]
+    found = [[itinerary for (leg, _), result in answered if leg == i for itinerary in result.itineraries]
+             for i in range(len(legs))]
+    outcome.missing_legs = [outcome.legs[i] for i, itineraries in enumerate(found)
+                            if not any(itinerary.segments for itinerary in itineraries)]
+    outcome.journeys = stitch(found) if not outcome.missing_legs else []
+
+def plan_search(input_dict):
+    # Returns ([(provider, payload), ...], token, same_day_return, no_service).
+    # Only locals: concurrent searches (server sessions, batch workers) share nothing here.
     if isinstance(input_dict, str):
         input_dict = json.loads(input_dict)
 
 
-    token = input_dict.get("token")
     # Step 1: Extract airlines (should be a list now)
     airline_detected = input_dict.get("airline", [])
     if isinstance(airline_detected, str):
@@ -22,12 +362,13 @@ def search_flights(input_dict):
     elif not isinstance(airline_detected, list):
         airline_detected = []
 
-    # Step 2: Map airline names to internal codes using get_airline_code
-    airlines_requested = [get_airline_code(name) for name in airline_detected if get_airline_code(name)]
+    # Step 2: Map airline names to internal codes
+    airlines_requested = [code for code in map(resolve_airline, airline_detected) if code]
 
 
 
-    flight_data = input_dict.get("data", input_dict)
+    # A copy, so the outer date overrides never leak into the caller's (possibly shared) details
+    flight_data = dict(input_dict.get("data", input_dict))
 
     # Override dates if present in outer layer
     if "departure_date" in input_dict:
@@ -43,58 +384,14 @@ def search_flights(input_dict):
         {"Type": "infant", "Count": 0}
     ])
 
-    # Choose content providers based on airline
-
-    avaible_airlines = ["sereneair", "airblue", "airsial", "amadeus", "oneapi"]
-
     # Step 3: Filter only valid airlines that exist in available providers
-    airlines_to_search = [a for a in airlines_requested if a in avaible_airlines]
+    airlines_to_search = [a for a in airlines_requested if a in AVAILABLE_PROVIDERS]
 
     # Fallback: If none of the mentioned airlines are available, search all
     if not airlines_to_search:
-        airlines_to_search = avaible_airlines
-
-    found_flight = False
-    results = []
-
-    def format_response(data, provider):
-        nonlocal found_flight
-        output = []
-
-        if not data.get("Itineraries"):
-            return ""
-
-        for itinerary in data["Itineraries"]:
-            for flight in itinerary["Flights"]:
-                carrier_name = flight["MarketingCarrier"]["name"]
-                carrier_code = get_airline_code(carrier_name)
-
-
-
-                found_flight = True
-                from_city = flight["From"]["city"]["name"]
-                to_city = flight["To"]["city"]["name"]
-                dep = flight["DepartureAt"]
-                arr = flight["ArrivalAt"]
-
-                try:
-                    dep_fmt = datetime.fromisoformat(dep).strftime("%I:%M %p, %d %b %Y")
-                    arr_fmt = datetime.fromisoformat(arr).strftime("%I:%M %p, %d %b %Y")
-                except:
-                    dep_fmt, arr_fmt = dep, arr
-
-                output.append(f"\n{carrier_name.title()} flight from {from_city} to {to_city}")
-                output.append(f"   Departure: {dep_fmt} | Arrival: {arr_fmt}")
-
-                for fare in flight.get("Fares", []):
-                    output.append(f"   Fare: {fare['Name'].upper()} - PKR {fare['ChargedTotalPrice']}")
-
-        if output:
-
-            header = f"\n-------------------------------------------------------\n Available Flights from {provider.title()}:\n"
-            return header + "\n".join(output)
-        return ""
+        airlines_to_search = AVAILABLE_PROVIDERS
 
+    payloads = []
     for provider in airlines_to_search:
         payload = {}
 
@@ -158,32 +455,22 @@ def search_flights(input_dict):
         else:
             continue
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-
-        try:
-            response = requests.post("https://bookmesky.com/air/api/search", headers=headers, json=payload)
-            if response.status_code != 200:
-                continue
-
-            data = response.json()
-            formatted = format_response(data, provider)
-            if formatted:
-                results.append(formatted)
-
-        except Exception as e:
-            results.append(f"Error while connecting to {provider.title()}: {str(e)}")
-
-    final_output = "\n".join(results)
-    if trip_type in ["round_trip", "return"] and dep_date == ret_date:
-        final_output += "\n\nYou can also check flights on other return dates."
-
-    if found_flight:
-        return final_output
-    else:
-        return "No Flight Found for the given route"
-
-
+        payloads.append((provider, payload))
+
+    # Step 4: Only call providers that serve the route; an unserved pair needs no token and no HTTP at all
+    no_service = False
+    if payloads:
+        route = route_key(payloads[0][1])
+        serving = set(route_index.providers_for(route, [provider for provider, _ in payloads],
+                                                class_key(payloads[0][1])))
+        if len(serving) < len(payloads):
+            count("route_pruned", value=len(payloads) - len(serving))
+        no_service = not serving
+        payloads = [(provider, payload) for provider, payload in payloads if provider in serving]
+
+    # Fall back to the cached Bookme token when the caller didn't pass one
+    token = (input_dict.get("token") or "").strip() or (get_token() if payloads else "")
+
+    same_day_return = (trip_type in ["round_trip", "return"]
+                       and flight_data.get("departure_date", "") == flight_data.get("return_date", ""))
+    return payloads, token, same_day_return, no_service
@@ -0,0 +1,88 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared, pooled HTTP session for every Bookme call (auth + search).
+# Connections are kept alive and reused, so a five-provider search pays for one TLS handshake, not five.
+
+BASE_URL = os.getenv("BOOKME_BASE_URL", "https://bookmesky.com").rstrip("/")
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_lock = threading.Lock()
+_retries = 0
+
+
+class CountingRetry(Retry):
+    def increment(self, *args, **kwargs):
+        global _retries
+        with _lock:
+            _retries += 1
+        return super().increment(*args, **kwargs)
+
+
+def build_session():
+    retry = CountingRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def reset_session():
+    global _session, _retries
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _retries = 0
+
+
+def post(path, json=None, headers=None, timeout=None):
+    url = path if path.startswith("http") else BASE_URL + path
+    return get_session().post(url, json=json, headers=headers, timeout=timeout or DEFAULT_TIMEOUT)
+
+
+def client_stats():
+    # num_requests / num_connections are kept per host pool by urllib3; requests beyond new connections were reused
+    sent, opened = 0, 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    sent += pool.num_requests
+                    opened += pool.num_connections
+
+    return {
+        "requests": sent,
+        "connections_opened": opened,
+        "connections_reused": max(sent - opened, 0),
+        "retries": _retries
+    }
@@ -1,6 +1,3 @@
-from difflib import get_close_matches
-
-
 CITY_TO_IATA = {
     "islamabad": "ISB",
     "karachi": "KHI",
@@ -54,13 +51,6 @@ def get_airline_code(user_input: str) -> str:
     if not user_input:
         return ""
 
-    normalized_input = user_input.strip().lower()
-
-    # Prepare lowercase variants
-    name_map = {k.lower(): v for k, v in AIRLINE_NAMES.items()}
-
-    # Get closest match
-    match = get_close_matches(normalized_input, name_map.keys(), n=1, cutoff=0.9)
-    if match:
-        return name_map[match[0]]  # Return the provider code
-    return ""  # Return empty if no match found
+    # Precompiled alias/fuzzy index, built once (imported here to avoid a circular import)
+    from Name_Resolver import resolve_airline
+    return resolve_airline(user_input)
@@ -0,0 +1,165 @@
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from IATA_Code import CITY_TO_IATA
+
+# Local stand-in for the Bookme auth and search APIs, used by the benchmarks.
+# Latency, error rate and payload size are configurable per provider, so slow, flaky and large responses can be reproduced.
+
+IATA_TO_CITY = {code: name.replace("_", " ").title() for name, code in CITY_TO_IATA.items()}
+
+PROVIDER_CARRIERS = {
+    "sereneair": "serene air",
+    "airblue": "airblue",
+    "airsial": "air sial",
+    "amadeus": "pia",
+    "oneapi": "fly jinnah"
+}
+
+
+def issue_token(ttl):
+    # JWT-shaped token whose exp claim Authentication_Tool reads
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+    claims = {"sub": "mock", "exp": int(time.time() + ttl), "jti": random.getrandbits(32)}
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(claims)}.mock"
+
+
+def build_itineraries(payload, flights_per_leg=2):
+    provider = payload.get("ContentProvider", "")
+    carrier = PROVIDER_CARRIERS.get(provider, provider)
+    locations = payload.get("Locations", [])
+    dates = payload.get("TravelingDates", [])
+
+    legs = []
+    if payload.get("TripType") == "return" and len(locations) >= 2 and len(dates) >= 2:
+        legs = [(locations[0]["IATA"], locations[1]["IATA"], dates[0]),
+                (locations[1]["IATA"], locations[0]["IATA"], dates[1])]
+    else:
+        for i, date in enumerate(dates):
+            if 2 * i + 1 < len(locations):
+                legs.append((locations[2 * i]["IATA"], locations[2 * i + 1]["IATA"], date))
+
+    itineraries = []
+    for n in range(flights_per_leg):
+        flights = []
+        for origin, destination, date in legs:
+            departure = datetime.fromisoformat(date) + timedelta(hours=7 + 4 * n)
+            flights.append({
+                "MarketingCarrier": {"name": carrier},
+                "From": {"city": {"name": IATA_TO_CITY.get(origin, origin)}},
+                "To": {"city": {"name": IATA_TO_CITY.get(destination, destination)}},
+                "DepartureAt": departure.isoformat(),
+                "ArrivalAt": (departure + timedelta(hours=1, minutes=50)).isoformat(),
+                "Fares": [
+                    {"Name": "value", "ChargedTotalPrice": 18500 + 1500 * n},
+                    {"Name": "flexi", "ChargedTotalPrice": 24500 + 1500 * n}
+                ]
+            })
+        itineraries.append({"Flights": flights})
+    return itineraries
+
+
+def per_provider(values, provider):
+    return values.get(provider, values.get("default", 0))
+
+
+def make_handler(delays, error_rates=None, flights_per_leg=2, auth_delay=0.0, token_ttl=3000, require_auth=False,
+                 stats=None):
+    # delays / error_rates map provider -> seconds / probability of a 500 ("default" applies to the rest)
+    error_rates = error_rates or {}
+    stats = stats if stats is not None else {}
+    issued = set()
+    lock = threading.Lock()
+
+    def count(name):
+        with lock:
+            stats[name] = stats.get(name, 0) + 1
+
+    class MockBookmeHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows up in Http_Client stats
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/partner/api/auth/token":
+                count("auth")
+                time.sleep(auth_delay)
+                token = issue_token(token_ttl)
+                with lock:
+                    issued.add(token)
+                self.send_json(200, {"Token": token})
+                return
+
+            if self.path != "/air/api/search":
+                self.send_error(404)
+                return
+
+            count("search")
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            if require_auth and token not in issued:
+                count("unauthorized")
+                self.send_json(401, {"message": "Unauthorized"})
+                return
+
+            provider = payload.get("ContentProvider")
+            time.sleep(per_provider(delays, provider))
+            if random.random() < per_provider(error_rates, provider):
+                count("errors")
+                self.send_json(500, {"message": "Provider error"})
+                return
+            self.send_json(200, {"Itineraries": build_itineraries(payload, flights_per_leg)})
+
+        def send_json(self, status, body):
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return MockBookmeHandler
+
+
+def start_mock_server(delays=None, host="127.0.0.1", port=0, error_rates=None, flights_per_leg=2, auth_delay=0.0,
+                      token_ttl=3000, require_auth=False):
+    # server.stats counts auth calls, searches, injected errors and rejected tokens
+    stats = {}
+    handler = make_handler(delays or {}, error_rates, flights_per_leg, auth_delay, token_ttl, require_auth, stats)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.stats = stats
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the Bookme auth and search APIs.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", action="append", default=[], metavar="PROVIDER=SECONDS",
+                        help="Per-provider response delay, e.g. --delay airblue=1.5 --delay default=0.2")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="PROVIDER=RATE",
+                        help="Per-provider share of searches answered with a 500, e.g. --error-rate airsial=0.2")
+    parser.add_argument("--flights", type=int, default=2, help="itineraries per provider (response size)")
+    parser.add_argument("--auth-delay", type=float, default=0.0, help="token endpoint delay in seconds")
+    parser.add_argument("--require-auth", action="store_true", help="reject searches without a token issued here")
+    args = parser.parse_args()
+
+    delays = {k: float(v) for k, v in (item.split("=", 1) for item in args.delay)}
+    error_rates = {k: float(v) for k, v in (item.split("=", 1) for item in args.error_rate)}
+    server, base_url = start_mock_server(delays, port=args.port, error_rates=error_rates, flights_per_leg=args.flights,
+                                         auth_delay=args.auth_delay, require_auth=args.require_auth)
+    print(f"Mock Bookme API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
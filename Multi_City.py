@@ -0,0 +1,62 @@
+import os
+import heapq
+from datetime import datetime, timedelta
+from Flight_Records import Journey
+
+# Multi-city trips searched leg by leg: every leg is an independent one-way search, all legs × providers
+# run in parallel, and the cheapest feasible combinations are stitched together afterwards. Legs that
+# found nothing don't hide the ones that did. MULTI_CITY_MODE=native sends one multi_city request per provider.
+
+MULTI_CITY_MODE = os.getenv("MULTI_CITY_MODE", "legs")
+MULTI_CITY_MAX_WORKERS = int(os.getenv("MULTI_CITY_MAX_WORKERS", "20"))  # concurrent leg×provider requests
+MULTI_CITY_COMBINATIONS = int(os.getenv("MULTI_CITY_COMBINATIONS", "3"))  # cheapest journeys returned
+MIN_CONNECTION_MINUTES = int(os.getenv("MIN_CONNECTION_MINUTES", "90"))  # arrival → next leg's departure
+
+
+def split_legs(flight_data):
+    # [(origin IATA, destination IATA, date), ...] from the extractor's Locations pairs and TravelingDates
+    locations = flight_data.get("Locations") or []
+    return [(locations[2 * i].get("IATA", ""), locations[2 * i + 1].get("IATA", ""), day)
+            for i, day in enumerate(flight_data.get("TravelingDates") or []) if 2 * i + 1 < len(locations)]
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def connects(previous, following, min_connection=MIN_CONNECTION_MINUTES):
+    # Enough time between the previous leg's arrival and the next leg's departure; unknown times are accepted
+    arrival = parse_time(previous.segments[-1].arrival)
+    departure = parse_time(following.segments[0].departure)
+    if arrival is None or departure is None:
+        return True
+    try:
+        return arrival + timedelta(minutes=min_connection) <= departure
+    except TypeError:  # one timestamp with a UTC offset, one without
+        return True
+
+
+def stitch(legs, k=MULTI_CITY_COMBINATIONS, min_connection=MIN_CONNECTION_MINUTES):
+    # legs: one list of Itineraries per leg. Returns the k cheapest feasible Journeys, cheapest first.
+    # Keeps the k cheapest partial journeys ending in each itinerary, leg by leg, so it stays exact and small.
+    ends = []
+    for leg in legs:
+        options = [itinerary for itinerary in leg if itinerary.segments and itinerary.min_price is not None]
+        if not ends:
+            ends = [(itinerary, [(itinerary.min_price, [itinerary])]) for itinerary in options]
+        else:
+            extended = []
+            for itinerary in options:
+                paths = [(price + itinerary.min_price, path + [itinerary])
+                         for previous, partial in ends if connects(previous, itinerary, min_connection)
+                         for price, path in partial]
+                if paths:
+                    extended.append((itinerary, heapq.nsmallest(k, paths, key=lambda path: path[0])))
+            ends = extended
+        if not ends:
+            return []
+    best = heapq.nsmallest(k, (path for _, partial in ends for path in partial), key=lambda path: path[0])
+    return [Journey(path) for _, path in best]
@@ -0,0 +1,102 @@
+import re
+from functools import lru_cache
+from difflib import SequenceMatcher
+from IATA_Code import CITY_TO_IATA, AIRLINE_NAMES
+
+# Airline and city name resolution shared by the extraction and search tools.
+# Indexes are built once at import: an exact alias index plus a trigram index that narrows fuzzy
+# matching ("Isloamabad", "Air Blu") to a handful of candidates before scoring them.
+
+AIRLINE_CUTOFF = 0.9  # same strictness as the old difflib.get_close_matches lookup
+CITY_CUTOFF = 0.8
+MEMO_SIZE = 4096
+
+SUFFIXES = re.compile(r"\s+(?:airlines?|airways|airport|city)$")
+
+
+def normalize_name(name):
+    name = re.sub(r"[\s_\-]+", " ", (name or "").strip().lower())
+    return SUFFIXES.sub("", name)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    def __init__(self, aliases, cutoff):
+        # aliases: {alias: code}; aliases are matched after normalize_name
+        self.cutoff = cutoff
+        self.exact = {}
+        for alias, code in aliases.items():
+            normalized = normalize_name(alias)
+            self.exact.setdefault(normalized, code)
+            self.exact.setdefault(normalized.replace(" ", ""), code)
+
+        self.grams = {}
+        for alias in self.exact:
+            # Codes like "khi" are exact-match only; fuzzy matching them would be mostly noise
+            if len(alias) >= 4:
+                for gram in trigrams(alias):
+                    self.grams.setdefault(gram, []).append(alias)
+
+    def candidates(self, text):
+        counts = {}
+        for gram in trigrams(text):
+            for alias in self.grams.get(gram, ()):
+                counts[alias] = counts.get(alias, 0) + 1
+        # Only aliases sharing a meaningful share of trigrams are worth scoring
+        needed = max(1, len(trigrams(text)) // 3)
+        return [alias for alias, shared in counts.items() if shared >= needed]
+
+    def resolve(self, name):
+        text = normalize_name(name)
+        if not text:
+            return None
+        code = self.exact.get(text) or self.exact.get(text.replace(" ", ""))
+        if code:
+            return code
+
+        best, best_score = None, self.cutoff
+        for alias in self.candidates(text):
+            score = SequenceMatcher(None, text, alias).ratio()
+            if score >= best_score and (best is None or score > best_score or alias < best):
+                best, best_score = alias, score
+        return self.exact[best] if best else None
+
+
+def airline_aliases():
+    aliases = {}
+    for name, code in AIRLINE_NAMES.items():
+        aliases[name] = code
+        aliases[code] = code
+    return aliases
+
+
+def city_aliases():
+    aliases = {}
+    for city, code in CITY_TO_IATA.items():
+        aliases[city] = code
+        aliases[code] = code
+    return aliases
+
+
+AIRLINE_INDEX = NameIndex(airline_aliases(), AIRLINE_CUTOFF)
+CITY_INDEX = NameIndex(city_aliases(), CITY_CUTOFF)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def resolve_airline(name: str) -> str:
+    # Bookme content provider code for an airline name ("PIA" → "amadeus"), or "" if unknown
+    return AIRLINE_INDEX.resolve(name) or ""
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def resolve_city(name: str):
+    # IATA code for a city name ("Isloamabad" → "ISB"), or None if unknown
+    return CITY_INDEX.resolve(name)
+
+
+def resolve(name: str, kind: str):
+    return resolve_airline(name) if kind == "airline" else resolve_city(name)
@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+from dataclasses import dataclass
+
+# Per-provider health for the search fan-out: a circuit breaker (open after N consecutive failures,
+# one half-open probe after a cool-down) and an EWMA of response latency. Which routes a provider serves
+# is tracked separately in Route_Index.py.
+
+FAILURE_THRESHOLD = int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "3"))  # consecutive failures before opening
+OPEN_SECONDS = float(os.getenv("PROVIDER_OPEN_SECONDS", "30"))  # cool-down before a half-open probe
+EWMA_ALPHA = float(os.getenv("PROVIDER_EWMA_ALPHA", "0.3"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(slots=True)
+class ProviderState:
+    state: str = CLOSED
+    failures: int = 0  # consecutive
+    opened_at: float = 0.0
+    probe_started: float = 0.0
+    ewma_ms: float = None
+    calls: int = 0
+    errors: int = 0
+
+
+class ProviderHealth:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS, alpha=EWMA_ALPHA):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.alpha = alpha
+        self.providers = {}
+        self.lock = threading.Lock()
+
+    def state_of(self, provider):
+        state = self.providers.get(provider)
+        if state is None:
+            state = self.providers[provider] = ProviderState()
+        return state
+
+    def allow(self, provider):
+        # False while the breaker is open; once the cool-down is over a single caller gets to probe
+        now = time.monotonic()
+        with self.lock:
+            state = self.state_of(provider)
+            if state.state == CLOSED:
+                return True
+            if state.state == OPEN and now - state.opened_at < self.open_seconds:
+                return False
+            # A probe that never reported back frees the slot after another cool-down
+            if state.state == HALF_OPEN and now - state.probe_started < self.open_seconds:
+                return False
+            state.state = HALF_OPEN
+            state.probe_started = now
+            return True
+
+    def record_success(self, provider, seconds):
+        with self.lock:
+            state = self.state_of(provider)
+            state.calls += 1
+            state.failures = 0
+            state.state = CLOSED
+            ms = seconds * 1000
+            state.ewma_ms = ms if state.ewma_ms is None else self.alpha * ms + (1 - self.alpha) * state.ewma_ms
+
+    def release(self, provider):
+        # Neither success nor failure (e.g. a 4xx caused by the request): a half-open probe hands its
+        # slot to the next caller, whose request can tell whether the provider recovered
+        with self.lock:
+            state = self.state_of(provider)
+            if state.state == HALF_OPEN:
+                state.state = OPEN  # cool-down already over, so the next allow() probes again
+
+    def record_failure(self, provider):
+        with self.lock:
+            state = self.state_of(provider)
+            state.calls += 1
+            state.errors += 1
+            state.failures += 1
+            if state.state == HALF_OPEN or state.failures >= self.failure_threshold:
+                state.state = OPEN
+                state.opened_at = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            return {
+                provider: {"state": s.state, "consecutive_failures": s.failures, "calls": s.calls, "errors": s.errors,
+                           "ewma_ms": round(s.ewma_ms, 1) if s.ewma_ms is not None else None}
+                for provider, s in self.providers.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.providers.clear()
+
+
+provider_health = ProviderHealth()
@@ -0,0 +1,256 @@
+import re
+import json
+import heapq
+from datetime import datetime, time
+from dataclasses import dataclass, field
+from Name_Resolver import resolve_airline
+from Data_Extraction_tool import AIRLINE_PATTERN
+from Flight_Records import Itinerary, Segment, render_itineraries, render_ranked
+
+# In-process filtering and ranking of already fetched itineraries, for refinements such as
+# "cheapest 3", "only PIA", "morning departures", "under 20k" or "flexi fares". Phrases the rules
+# understand never reach an LLM; otherwise the LLM only translates the phrase into FlightFilter fields.
+
+DAYPARTS = {
+    "early morning": (time(0, 0), time(8, 0)),
+    "morning": (time(5, 0), time(12, 0)),
+    "afternoon": (time(12, 0), time(17, 0)),
+    "evening": (time(17, 0), time(21, 0)),
+    "night": (time(20, 0), time(23, 59)),
+}
+SORT_WORDS = {"cheapest": "cheapest", "lowest": "cheapest", "cheaper": "cheapest", "cheap": "cheapest",
+              "earliest": "earliest", "first": "earliest", "latest": "latest", "last": "latest"}
+
+AMOUNT = r"(?:pkr|rs\.?)?\s*(\d+(?:\.\d+)?)\s*(k)?"
+CLOCK = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?"
+
+SORT_PATTERN = re.compile(r"\b(?:top\s+(\d+)\s+)?(cheapest|lowest|cheaper|cheap|earliest|first|latest|last)(?:\s+(\d+))?\b")
+DAYPART_PATTERN = re.compile(r"\b(early morning|morning|afternoon|evening|night)\b")
+TIME_PATTERN = re.compile(r"\b(depart(?:ing|ure|s)?|leav(?:e|ing|es)|arriv(?:e|ing|al|es))?\s*(before|after|by)\s+" + CLOCK + r"\b")
+BETWEEN_PATTERN = re.compile(r"\bbetween\s+" + AMOUNT + r"\s+and\s+" + AMOUNT + r"\b")
+PRICE_PATTERN = re.compile(r"\b(under|below|less than|cheaper than|max|upto|up to|over|above|more than|min)\s+" + AMOUNT + r"\b")
+FARE_PATTERN = re.compile(r"\b(value|flexi|basic|standard|extra|premium|saver|light|plus)\s+fares?\b")
+LIMIT_PATTERN = re.compile(r"\b(?:top|only|just|show)\s+(\d+)\b")
+FILTER_WORDS = {
+    "only", "just", "show", "me", "the", "a", "an", "flights", "flight", "options", "ones", "one", "fares", "fare",
+    "with", "on", "in", "by", "please", "give", "which", "are", "is", "what", "filter", "sort", "them", "those",
+    "results", "departures", "departure", "departing", "arrivals", "flying", "from", "that", "to", "of", "and",
+    "price", "prices", "pkr", "rs", "airline", "airlines", "list", "i", "want", "need", "prefer", "any", "can", "you",
+    "sorted", "order", "ordered", "leaving", "arriving", "time", "times", "for", "at", "now", "then", "out"
+}
+
+
+@dataclass(slots=True)
+class FlightFilter:
+    carriers: list = field(default_factory=list)  # provider codes, as in Segment.carrier_code
+    depart_after: time = None
+    depart_before: time = None
+    arrive_after: time = None
+    arrive_before: time = None
+    fare_names: list = field(default_factory=list)
+    min_price: float = None
+    max_price: float = None
+    sort: str = None  # "cheapest", "earliest" or "latest"
+    limit: int = None
+
+
+def amount(value, thousands):
+    return float(value) * (1000 if thousands else 1)
+
+
+def clock(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return time(min(hour, 23), min(minute, 59))
+
+
+def parse_filters(query):
+    # FlightFilter for a refinement phrase, or None when the rules don't understand every word of it
+    text = " ".join(query.lower().replace(",", " ").split())
+    spec = FlightFilter()
+    found = False
+
+    airlines = AIRLINE_PATTERN.findall(text)
+    if airlines:
+        spec.carriers = sorted({code for code in map(resolve_airline, airlines) if code})
+        text = AIRLINE_PATTERN.sub(" ", text)
+        found = True
+
+    for match in TIME_PATTERN.finditer(text):
+        which, relation = match.group(1) or "depart", match.group(2)
+        value = clock(match.group(3), match.group(4), match.group(5))
+        prefix = "arrive" if which.startswith("arriv") else "depart"
+        setattr(spec, f"{prefix}_{'after' if relation == 'after' else 'before'}", value)
+        found = True
+    text = TIME_PATTERN.sub(" ", text)
+
+    match = DAYPART_PATTERN.search(text)
+    if match:
+        spec.depart_after, spec.depart_before = DAYPARTS[match.group(1)]
+        text = DAYPART_PATTERN.sub(" ", text)
+        found = True
+
+    match = BETWEEN_PATTERN.search(text)
+    if match:
+        spec.min_price = amount(match.group(1), match.group(2))
+        spec.max_price = amount(match.group(3), match.group(4))
+        text = BETWEEN_PATTERN.sub(" ", text)
+        found = True
+    for match in PRICE_PATTERN.finditer(text):
+        bound = amount(match.group(2), match.group(3))
+        if match.group(1) in ("over", "above", "more than", "min"):
+            spec.min_price = bound
+        else:
+            spec.max_price = bound
+        found = True
+    text = PRICE_PATTERN.sub(" ", text)
+
+    fares = FARE_PATTERN.findall(text)
+    if fares:
+        spec.fare_names = sorted(set(fares))
+        text = FARE_PATTERN.sub(" ", text)
+        found = True
+
+    match = SORT_PATTERN.search(text)
+    if match:
+        spec.sort = SORT_WORDS[match.group(2)]
+        if match.group(1) or match.group(3):
+            spec.limit = int(match.group(1) or match.group(3))
+        text = SORT_PATTERN.sub(" ", text)
+        found = True
+
+    match = LIMIT_PATTERN.search(text)
+    if match and spec.limit is None:
+        spec.limit = int(match.group(1))
+        text = LIMIT_PATTERN.sub(" ", text)
+
+    if not found or any(word not in FILTER_WORDS for word in re.findall(r"[a-z0-9]+", text)):
+        return None
+    return spec
+
+
+def filter_prompt(query):
+    # Prompt that only asks the LLM to translate the phrase; the results themselves never leave the process
+    return f"""
+Translate this refinement of a flight search into filter parameters.
+Refinement: "{query}"
+
+Return ONLY this JSON (null or [] for anything not asked for, times as HH:MM in 24h, prices in PKR):
+{{"airlines": [], "depart_after": null, "depart_before": null, "arrive_after": null, "arrive_before": null,
+  "fare_names": [], "min_price": null, "max_price": null, "sort": "cheapest | earliest | latest | null", "limit": null}}
+
+Airline names: Fly Jinnah, PIA, Airblue, Air Sial, Serene Air.
+If it is not a refinement of earlier results, answer NEW_QUERY.
+"""
+
+
+def filters_from_json(text):
+    # FlightFilter from the LLM's answer to filter_prompt, or None for NEW_QUERY / unusable output
+    if "NEW_QUERY" in text:
+        return None
+    try:
+        data = json.loads(re.sub(r"^```json|```$", "", text.strip(), flags=re.MULTILINE).strip())
+    except ValueError:
+        return None
+
+    def as_time(value):
+        try:
+            return datetime.strptime(value, "%H:%M").time() if value else None
+        except (TypeError, ValueError):
+            return None
+
+    def as_number(value):
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    return FlightFilter(
+        carriers=sorted({code for code in map(resolve_airline, data.get("airlines") or []) if code}),
+        depart_after=as_time(data.get("depart_after")),
+        depart_before=as_time(data.get("depart_before")),
+        arrive_after=as_time(data.get("arrive_after")),
+        arrive_before=as_time(data.get("arrive_before")),
+        fare_names=[name.lower() for name in data.get("fare_names") or []],
+        min_price=as_number(data.get("min_price")),
+        max_price=as_number(data.get("max_price")),
+        sort=data.get("sort") if data.get("sort") in ("cheapest", "earliest", "latest") else None,
+        limit=int(data["limit"]) if isinstance(data.get("limit"), int) and data["limit"] > 0 else None
+    )
+
+
+def clock_time(value):
+    try:
+        return datetime.fromisoformat(value).time()
+    except (TypeError, ValueError):
+        return None
+
+
+def within(value, after, before):
+    if value is None:
+        return after is None and before is None
+    if after and before and after > before:  # window across midnight
+        return value >= after or value <= before
+    return (after is None or value >= after) and (before is None or value <= before)
+
+
+def matches(itinerary, spec):
+    segments = itinerary.segments
+    if not segments:
+        return False
+    if spec.carriers and any(segment.carrier_code not in spec.carriers for segment in segments):
+        return False
+    if not within(clock_time(segments[0].departure), spec.depart_after, spec.depart_before):
+        return False
+    if not within(clock_time(segments[-1].arrival), spec.arrive_after, spec.arrive_before):
+        return False
+    price = itinerary.min_price
+    if price is None:
+        return False
+    return (spec.min_price is None or price >= spec.min_price) and (spec.max_price is None or price <= spec.max_price)
+
+
+def narrow_fares(itinerary, spec):
+    # Keep only the fares asked for (and within the price range); None if a segment has none left
+    segments = []
+    for segment in itinerary.segments:
+        fares = [fare for fare in segment.fares
+                 if (not spec.fare_names or fare.name.lower() in spec.fare_names)
+                 and (spec.min_price is None or fare.price >= spec.min_price)
+                 and (spec.max_price is None or fare.price <= spec.max_price)]
+        if not fares:
+            return None
+        segments.append(Segment(segment.carrier, segment.carrier_code, segment.origin, segment.destination,
+                                segment.departure, segment.arrival, fares))
+    return Itinerary(itinerary.provider, segments)
+
+
+def apply_filters(itineraries, spec):
+    # Filtered itineraries; with a sort, the top `limit` in that order via heap selection
+    kept = []
+    for itinerary in itineraries:
+        narrowed = narrow_fares(itinerary, spec) if (spec.fare_names or spec.min_price is not None
+                                                     or spec.max_price is not None) else itinerary
+        if narrowed is not None and matches(narrowed, spec):
+            kept.append(narrowed)
+
+    if spec.sort == "cheapest":
+        key = lambda itinerary: itinerary.min_price
+    elif spec.sort in ("earliest", "latest"):
+        key = lambda itinerary: itinerary.segments[0].departure
+    else:
+        return kept[:spec.limit] if spec.limit else kept
+
+    limit = spec.limit or len(kept)
+    if spec.sort == "latest":
+        return heapq.nlargest(limit, kept, key=key)
+    return heapq.nsmallest(limit, kept, key=key)
+
+
+def render_filtered(itineraries, spec):
+    if not itineraries:
+        return "No flights match these filters"
+    return render_ranked(itineraries) if spec.sort else render_itineraries(itineraries)
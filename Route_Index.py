@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import logging
+import threading
+from Tracing import count
+
+# Which content providers serve which route, so a search only calls providers that can have inventory
+# and unserved city pairs are answered without any HTTP. Seeded from a static JSON file
+# ({"KHI-LHE": ["airblue", "airsial", ...], "TUK-KDU": []}) and learned from provider responses.
+# Empty answers are learned per route and travel class and only prune a provider once they span
+# ROUTE_INDEX_MIN_EMPTY distinct dates (a sold-out day or an unsold class is not "doesn't fly here").
+# A pruned provider still gets one probe request every ROUTE_INDEX_PROBE_INTERVAL, so the index can
+# learn that it flies the route again. Learned entries expire after ROUTE_INDEX_TTL and the seed file
+# is re-read when it changes.
+
+ROUTE_INDEX_ENABLED = os.getenv("ROUTE_INDEX", "1") != "0"
+ROUTE_INDEX_FILE = os.getenv("ROUTE_INDEX_FILE", "route_index.json")
+ROUTE_INDEX_TTL = float(os.getenv("ROUTE_INDEX_TTL", "86400"))  # seconds a learned answer is trusted
+ROUTE_INDEX_MIN_EMPTY = int(os.getenv("ROUTE_INDEX_MIN_EMPTY", "3"))  # empty dates before a provider is pruned
+ROUTE_INDEX_PROBE_INTERVAL = float(os.getenv("ROUTE_INDEX_PROBE_INTERVAL", "3600"))  # seconds between probes of a pruned provider
+ROUTE_INDEX_RELOAD_INTERVAL = 60  # seconds between seed file checks
+
+logger = logging.getLogger("route_index")
+
+
+def route_key(payload):
+    return "-".join((loc.get("IATA") or "").upper() for loc in payload.get("Locations", []))
+
+
+def class_key(payload):
+    return (payload.get("TravelClass") or "economy").lower()
+
+
+def dates_key(payload):
+    return ",".join(payload.get("TravelingDates") or [])
+
+
+class RouteIndex:
+    def __init__(self, seed_path=ROUTE_INDEX_FILE, ttl=ROUTE_INDEX_TTL, min_empty=ROUTE_INDEX_MIN_EMPTY,
+                 probe_interval=ROUTE_INDEX_PROBE_INTERVAL):
+        self.seed_path = seed_path
+        self.ttl = ttl
+        self.min_empty = min_empty
+        self.probe_interval = probe_interval
+        self.seed = {}
+        self.seed_mtime = None
+        self.checked_at = 0.0
+        # (route, travel class) -> {provider: [{empty date: answered at}, last inventory at, last empty/probe at]}
+        self.learned = {}
+        self.lock = threading.Lock()
+        self.reload_seed()
+
+    def reload_seed(self):
+        self.checked_at = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.seed_path) if self.seed_path else None
+        except OSError:
+            mtime = None
+        if mtime == self.seed_mtime:
+            return
+        seed = {}
+        if mtime is not None:
+            try:
+                with open(self.seed_path, encoding="utf-8") as f:
+                    seed = {route.upper(): set(providers) for route, providers in json.load(f).items()}
+            except (OSError, ValueError, AttributeError, TypeError) as e:
+                # A bad seed file must not break searches: keep the previous seed (unknown routes go to everyone)
+                # and try again once the file changes
+                logger.error("Ignoring route index seed %s: %s", self.seed_path, e)
+                count("route_index_seed_errors")
+                with self.lock:
+                    self.seed_mtime = mtime
+                return
+        with self.lock:
+            self.seed, self.seed_mtime = seed, mtime
+
+    def pruned(self, learned, now):
+        empties, inventory_at, _ = learned
+        if now - inventory_at < self.ttl:
+            return False
+        return sum(1 for at in empties.values() if now - at < self.ttl) >= self.min_empty
+
+    def serves(self, route, travel_class, provider, now, probe=False):
+        learned = self.learned.get((route, travel_class), {}).get(provider)
+        if learned and self.pruned(learned, now):
+            if probe and now - learned[2] >= self.probe_interval:
+                learned[2] = now  # this search is the probe; the rest keep skipping the provider
+                count("route_probe", provider=provider)
+                return True
+            return False
+        seeded = self.seed.get(route)
+        return provider in seeded if seeded is not None else True  # unknown routes go to everyone
+
+    def providers_for(self, route, providers, travel_class="economy"):
+        # The subset of providers worth calling for this route and class; [] means nobody serves it
+        if not ROUTE_INDEX_ENABLED:
+            return list(providers)
+        if time.monotonic() - self.checked_at > ROUTE_INDEX_RELOAD_INTERVAL:
+            self.reload_seed()
+        now = time.time()
+        with self.lock:
+            return [provider for provider in providers if self.serves(route, travel_class, provider, now, probe=True)]
+
+    def record(self, route, provider, has_inventory, travel_class="economy", dates=""):
+        now = time.time()
+        with self.lock:
+            learned = self.learned.setdefault((route, travel_class), {}).setdefault(provider, [{}, 0.0, 0.0])
+            if has_inventory:
+                learned[0].clear()
+                learned[1] = now
+            else:
+                learned[0][dates] = now
+                learned[2] = now  # the next probe is due a full interval after the last empty answer
+
+    def snapshot(self):
+        # Current view in seed-file format, e.g. to refresh the seed; providers never seen on a route are left out
+        # (a provider is listed if it is not pruned in at least one travel class)
+        now = time.time()
+        with self.lock:
+            classes = {}
+            for route, travel_class in self.learned:
+                classes.setdefault(route, []).append(travel_class)
+            snapshot = {}
+            for route in sorted(set(self.seed) | set(classes)):
+                seen = set(self.seed.get(route, ()))
+                for travel_class in classes.get(route, []):
+                    seen |= set(self.learned[(route, travel_class)])
+                snapshot[route] = sorted(p for p in seen if any(self.serves(route, c, p, now)
+                                                                for c in classes.get(route, ["economy"])))
+            return snapshot
+
+    def stats(self):
+        with self.lock:
+            return {"seeded_routes": len(self.seed), "learned_routes": len({route for route, _ in self.learned})}
+
+    def reset(self):
+        with self.lock:
+            self.learned.clear()
+
+
+route_index = RouteIndex()
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# TTL + LRU cache for provider search responses, keyed by the normalized request payload.
+# Fares only need to be minutes fresh, so repeated route/date/class/traveler searches are served locally.
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))  # seconds
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR", "")  # set to keep entries on disk across restarts
+SEARCH_CACHE_DISK_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_DISK_MAX_ENTRIES", "10000"))
+SEARCH_CACHE_DISK_PURGE_EVERY = int(os.getenv("SEARCH_CACHE_DISK_PURGE_EVERY", "64"))  # writes between cleanups
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") != "0"  # share one upstream call between identical in-flight searches
+
+KEY_FIELDS = ("Locations", "ContentProvider", "TravelClass", "TripType", "TravelingDates", "Travelers")
+
+
+def canonical_payload(payload):
+    locations = [{"IATA": (loc.get("IATA") or "").upper(), "Type": (loc.get("Type") or "airport").lower()}
+                 for loc in payload.get("Locations", [])]
+    travelers = sorted(
+        ({"Type": (t.get("Type") or "").lower(), "Count": int(t.get("Count") or 0)}
+         for t in payload.get("Travelers", []) if int(t.get("Count") or 0) > 0),
+        key=lambda t: t["Type"]
+    )
+    return {
+        "Locations": locations,
+        "ContentProvider": (payload.get("ContentProvider") or "").lower(),
+        "TravelClass": (payload.get("TravelClass") or "").lower(),
+        "TripType": (payload.get("TripType") or "").lower(),
+        "TravelingDates": list(payload.get("TravelingDates", [])),
+        "Travelers": travelers
+    }
+
+
+def cache_key(payload):
+    raw = json.dumps(canonical_payload(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class DiskBackend:
+    # Expired rows are purged and the oldest rows beyond max_entries evicted at startup and every
+    # purge_every writes, so a long-running process keeps the file bounded
+    def __init__(self, directory, max_entries=SEARCH_CACHE_DISK_MAX_ENTRIES, purge_every=SEARCH_CACHE_DISK_PURGE_EVERY):
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self.writes = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "search_cache.sqlite"), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+        self.purge_expired()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT expires_at, value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row and row[0] > time.time():
+            return row
+        return None
+
+    def put(self, key, expires_at, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, expires_at, value))
+            self.writes += 1
+            purge = self.writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, key):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        # Every entry lives for the same TTL, so the earliest expiry is the oldest write
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            self.conn.execute("DELETE FROM entries WHERE key IN "
+                              "(SELECT key FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries")
+
+
+class SearchCache:
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES,
+                 max_bytes=SEARCH_CACHE_MAX_BYTES, directory=SEARCH_CACHE_DIR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = DiskBackend(directory) if directory else None
+        self.entries = OrderedDict()  # key -> (expires_at, serialized response)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] <= now:
+                self.drop(key)
+                self.counters["expirations"] += 1
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return json.loads(entry[1])
+
+        row = self.disk.get(key) if self.disk else None
+        with self.lock:
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["disk_hits"] += 1
+            self.store(key, row[0], row[1])
+        return json.loads(row[1])
+
+    def put(self, key, value):
+        raw = json.dumps(value, separators=(",", ":"))
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self.store(key, expires_at, raw)
+        if self.disk:
+            self.disk.put(key, expires_at, raw)
+
+    def store(self, key, expires_at, raw):
+        if len(raw) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.drop(key)
+        self.entries[key] = (expires_at, raw)
+        self.size += len(raw)
+        # Evict least recently used entries until both limits hold
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self.drop(oldest)
+            self.counters["evictions"] += 1
+
+    def drop(self, key):
+        _, raw = self.entries.pop(key)
+        self.size -= len(raw)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+        if self.disk:
+            self.disk.clear()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.size)
+
+
+search_cache = SearchCache()
+
+
+class SingleFlight:
+    # Identical searches in flight at the same time (same cache_key) share one upstream call and its result:
+    # the first caller runs it, later callers wait for it instead of sending their own request.
+    def __init__(self, enabled=SINGLE_FLIGHT):
+        self.enabled = enabled
+        self.calls = {}  # key -> [done event, result]
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "shared": 0}
+
+    def run(self, key, call, timeout=None, on_timeout=None):
+        if not self.enabled:
+            return call()
+        with self.lock:
+            flight = self.calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.calls[key] = [threading.Event(), None]
+                self.counters["calls"] += 1
+            else:
+                self.counters["shared"] += 1
+
+        if not leader:
+            return flight[1] if flight[0].wait(timeout) else on_timeout
+        try:
+            flight[1] = call()
+        finally:
+            # Unregister before waking the followers, so a later search starts a fresh call (or hits the cache)
+            with self.lock:
+                del self.calls[key]
+            flight[0].set()
+        return flight[1]
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, in_flight=len(self.calls))
+
+
+single_flight = SingleFlight()
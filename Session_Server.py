@@ -0,0 +1,256 @@
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from aiohttp import web, WSMsgType
+from dotenv import load_dotenv
+
+load_dotenv()  # before the project imports, which read their settings at import time
+
+import main_agent
+from Slot_Memory import SlotMemory
+from Tracing import count, span
+
+# asyncio HTTP/WebSocket front end running many agent sessions at once. Each session has its own history
+# and slots; the token cache, HTTP pool, search cache and FAISS store are shared process-wide.
+# Turns run on a bounded worker pool (the pipeline is blocking), one at a time per session.
+#
+#   POST   /sessions                  → {"session_id"}
+#   POST   /sessions/{id}/messages    {"query"} → {"response", "output": [...]}
+#   GET    /sessions/{id}/ws          one query per text message; output is streamed as it is produced
+#   DELETE /sessions/{id}
+#   GET    /health
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_MAX_RUNNING = int(os.getenv("SERVER_MAX_RUNNING", "8"))  # turns executing at once (worker threads)
+SERVER_MAX_QUEUED = int(os.getenv("SERVER_MAX_QUEUED", "32"))  # admitted turns waiting for a worker
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "1000"))
+SESSION_RATE = float(os.getenv("SESSION_RATE", "0.5"))  # turns per second per session, sustained
+SESSION_BURST = int(os.getenv("SESSION_BURST", "5"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))  # seconds before an idle session is dropped
+
+
+@dataclass(slots=True)
+class Session:
+    id: str
+    history: list = field(default_factory=list)
+    slots: SlotMemory = field(default_factory=SlotMemory)
+    tokens: float = SESSION_BURST
+    refilled_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+    turn_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def take(self, rate=SESSION_RATE, burst=SESSION_BURST):
+        # Token bucket: False when the session is over its rate limit
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = self.last_seen = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class SessionStore:
+    def __init__(self, max_sessions=SERVER_MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def create(self):
+        with self.lock:
+            self.expire()
+            if len(self.sessions) >= self.max_sessions:
+                return None
+            session = Session(uuid.uuid4().hex)
+            self.sessions[session.id] = session
+            return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None and time.monotonic() - session.last_seen > self.idle_ttl:
+                del self.sessions[session_id]
+                return None
+            return session
+
+    def remove(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def expire(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        for session_id in [sid for sid, s in self.sessions.items() if now - s.last_seen > self.idle_ttl]:
+            del self.sessions[session_id]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sessions)
+
+
+class Admission:
+    # Bounds the turns in the server: at most max_running execute and max_queued wait; the rest are refused
+    def __init__(self, max_running=SERVER_MAX_RUNNING, max_queued=SERVER_MAX_QUEUED):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="turn")
+        self.pending = 0
+        self.rejected = 0
+
+    def admit(self):
+        if self.pending >= self.max_running + self.max_queued:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        self.pending -= 1
+
+    def stats(self):
+        return {"running_limit": self.max_running, "queued_limit": self.max_queued,
+                "pending": self.pending, "rejected": self.rejected}
+
+
+def refusal(session, admission):
+    # (status, message) when this turn can't start now, else None
+    if not session.take():
+        count("server_refused", reason="rate_limited")
+        return 429, "Too many requests for this session, please slow down."
+    if not admission.admit():
+        count("server_refused", reason="busy")
+        return 503, "The server is busy, please try again shortly."
+    return None
+
+
+async def run_session_turn(app, session, query, output):
+    # Runs one turn on the worker pool; the caller has admitted it. output is called from the worker thread.
+    admission = app["admission"]
+    try:
+        async with session.turn_lock:
+            loop = asyncio.get_running_loop()
+            with span("session_turn"):
+                return await loop.run_in_executor(
+                    admission.executor, main_agent.run_turn, query, session.history, session.slots,
+                    lambda text: text and output(text)  # blank verdicts are only spacing in the CLI
+                )
+    finally:
+        admission.release()
+
+
+def json_error(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+async def create_session(request):
+    session = request.app["store"].create()
+    if session is None:
+        count("server_refused", reason="sessions")
+        return json_error(503, "Too many open sessions, please try again later.")
+    return web.json_response({"session_id": session.id}, status=201)
+
+
+async def delete_session(request):
+    if not request.app["store"].remove(request.match_info["session_id"]):
+        return json_error(404, "Unknown session")
+    return web.json_response({"deleted": True})
+
+
+async def post_message(request):
+    session = request.app["store"].get(request.match_info["session_id"])
+    if session is None:
+        return json_error(404, "Unknown session")
+    try:
+        query = str((await request.json()).get("query") or "").strip()
+    except (ValueError, AttributeError):
+        query = ""
+    if not query:
+        return json_error(400, 'Expected a JSON body like {"query": "karachi to lahore tomorrow"}')
+
+    refused = refusal(session, request.app["admission"])
+    if refused:
+        return json_error(*refused)
+
+    output = []
+    try:
+        response = await run_session_turn(request.app, session, query, output.append)
+    except Exception as e:
+        count("server_turn_errors")
+        return json_error(500, f"Error while handling the request: {e}")
+    return web.json_response({"session_id": session.id, "response": response, "output": output})
+
+
+async def session_socket(request):
+    session = request.app["store"].get(request.match_info["session_id"])
+    if session is None:
+        return json_error(404, "Unknown session")
+
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    loop = asyncio.get_running_loop()
+
+    async for message in ws:
+        if message.type != WSMsgType.TEXT:
+            continue
+        query = message.data.strip()
+        if not query:
+            continue
+        refused = refusal(session, request.app["admission"])
+        if refused:
+            await ws.send_json({"type": "error", "status": refused[0], "text": refused[1]})
+            continue
+
+        # Worker thread → event loop: each message is sent as soon as the pipeline produces it
+        outbox = asyncio.Queue()
+        turn = asyncio.ensure_future(run_session_turn(
+            request.app, session, query, lambda text: loop.call_soon_threadsafe(outbox.put_nowait, text)
+        ))
+        while not turn.done() or not outbox.empty():
+            getter = asyncio.ensure_future(outbox.get())
+            await asyncio.wait({getter, turn}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                await ws.send_json({"type": "output", "text": getter.result()})
+            else:
+                getter.cancel()
+        try:
+            await ws.send_json({"type": "response", "text": turn.result()})
+        except Exception as e:
+            count("server_turn_errors")
+            await ws.send_json({"type": "error", "status": 500, "text": f"Error while handling the request: {e}"})
+    return ws
+
+
+async def health(request):
+    return web.json_response({"sessions": len(request.app["store"]), **request.app["admission"].stats()})
+
+
+async def shutdown(app):
+    app["admission"].executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_app(store=None, admission=None):
+    app = web.Application()
+    app["store"] = store or SessionStore()
+    app["admission"] = admission or Admission()
+    app.router.add_post("/sessions", create_session)
+    app.router.add_delete("/sessions/{session_id}", delete_session)
+    app.router.add_post("/sessions/{session_id}/messages", post_message)
+    app.router.add_get("/sessions/{session_id}/ws", session_socket)
+    app.router.add_get("/health", health)
+    app.on_shutdown.append(shutdown)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the flight agent to many concurrent sessions")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+    web.run_app(build_app(), host=args.host, port=args.port)
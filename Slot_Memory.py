@@ -0,0 +1,183 @@
+import re
+import copy
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from Date import resolve_date
+from Name_Resolver import resolve_airline
+from Data_Extraction_tool import (CITY_PATTERN, DATE_PATTERN, AIRLINE_PATTERN, CLASS_PATTERN, ONE_WAY_PATTERN,
+                                  FAST_TRAVELER_PATTERN, validate_airlines)
+
+# Per-session trip slots (route, dates, class, travelers, airlines) kept from the last extraction.
+# Follow-ups like "make it the 14th", "only Airblue" or "2 adults in business" are merged into them
+# locally and go straight to search, without FAISS, the LLM filter or a new Gemini extraction.
+# Anything the rules don't fully understand falls through to the normal path.
+# The itineraries of the session's last search are kept too, for local filtering (see Result_Filter.py).
+
+SLOT_FIELDS = ("TripType", "source", "destination", "date", "departure_date", "return_date",
+               "TravelClass", "Travelers", "airline_detected")
+DATE_FIELDS = ("date", "departure_date", "return_date")
+
+DAY_PATTERN = re.compile(r"\bthe\s+(\d{1,2})(?:st|nd|rd|th)?\b|\b(\d{1,2})(?:st|nd|rd|th)\b")
+SHIFT_PATTERN = re.compile(r"\b(a|one|\d+)\s+days?\s+(later|earlier|after|before)\b")
+RETURN_PATTERN = re.compile(r"\b(?:return(?:ing)?|coming back|back)\b")
+ANY_AIRLINE_PATTERN = re.compile(r"\b(?:any|all)\s+airlines?\b")
+FROM_CITY_PATTERN = re.compile(r"\bfrom\s+(" + CITY_PATTERN.pattern[3:-3] + r")\b")
+REFINEMENT_WORDS = {
+    "make", "it", "change", "instead", "only", "just", "the", "date", "to", "on", "please", "what", "about", "how",
+    "with", "for", "in", "class", "airline", "airlines", "flight", "flights", "show", "me", "can", "you", "i", "we",
+    "want", "switch", "actually", "and", "fly", "flying", "rather", "no", "then", "same", "but", "trip", "ok", "okay",
+    "a", "an", "of", "by", "via", "from", "day", "travel", "go", "going", "search", "again", "try", "let", "lets", "s"
+}
+
+
+def as_date(value):
+    # The slot's date, or None when it is empty or not a date (e.g. Date.py's "Could not resolve the date.")
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def day_of_month(day, base):
+    # "the 14th": that day in the month already being searched, or in the next month if it has passed
+    try:
+        candidate = base.replace(day=day)
+    except ValueError:
+        return None
+    if candidate < date.today():
+        try:
+            candidate = (base + relativedelta(months=1)).replace(day=day)
+        except ValueError:
+            return None
+    return candidate.isoformat()
+
+
+def parse_refinement(query, slots):
+    # Returns the slot changes a follow-up asks for, or None when it is not a pure refinement
+    text = " ".join(query.lower().replace(",", " , ").split())
+    if len(CITY_PATTERN.findall(text)) >= 2:
+        return None  # a new route: leave it to the extractor
+
+    changes = {}
+    round_trip = slots.get("TripType") in ("return", "round_trip")
+    current = as_date(slots.get("departure_date") if round_trip else slots.get("date"))
+    returning = bool(RETURN_PATTERN.search(text))
+
+    new_date = None
+    match = SHIFT_PATTERN.search(text)
+    if match and current:
+        days = 1 if match.group(1) in ("a", "one") else int(match.group(1))
+        sign = 1 if match.group(2) in ("later", "after") else -1
+        new_date = (current + relativedelta(days=sign * days)).isoformat()
+        text = SHIFT_PATTERN.sub(" ", text)
+    else:
+        match = DATE_PATTERN.search(text)
+        if match:
+            resolved = resolve_date(match.group(0))
+            if resolved == "Could not resolve the date.":
+                return None
+            new_date = resolved
+            text = DATE_PATTERN.sub(" ", text)
+        else:
+            match = DAY_PATTERN.search(text)
+            if match:
+                base = current or date.today()
+                new_date = day_of_month(int(match.group(1) or match.group(2)), base)
+                if new_date is None:
+                    return None
+                text = DAY_PATTERN.sub(" ", text)
+
+    if new_date:
+        if returning:
+            changes.update(TripType="return", return_date=new_date, date="",
+                           departure_date=slots.get("departure_date") or slots.get("date") or "")
+        elif round_trip:
+            changes["departure_date"] = new_date
+        else:
+            changes["date"] = new_date
+    text = RETURN_PATTERN.sub(" ", text)
+
+    if ONE_WAY_PATTERN.search(text) and round_trip:
+        changes.update(TripType="one_way", date=changes.get("departure_date") or slots.get("departure_date") or "",
+                       departure_date="", return_date="")
+    text = ONE_WAY_PATTERN.sub(" ", text)
+
+    if ANY_AIRLINE_PATTERN.search(text):
+        changes["airline_detected"] = []
+        text = ANY_AIRLINE_PATTERN.sub(" ", text)
+    airlines = AIRLINE_PATTERN.findall(text)
+    if airlines:
+        changes["airline_detected"] = validate_airlines(airlines)
+        text = AIRLINE_PATTERN.sub(" ", text)
+
+    travel_class = CLASS_PATTERN.search(text)
+    if travel_class:
+        changes["TravelClass"] = travel_class.group(1)
+        text = CLASS_PATTERN.sub(" ", text)
+
+    travelers = FAST_TRAVELER_PATTERN.findall(text)
+    if travelers:
+        counts = {"adult": 0, "child": 0, "infant": 0}
+        for count, kind in travelers:
+            counts[kind] += int(count)
+        changes["Travelers"] = [{"Type": kind, "Count": n} for kind, n in counts.items()]
+        text = FAST_TRAVELER_PATTERN.sub(" ", text)
+
+    match = FROM_CITY_PATTERN.search(text) or CITY_PATTERN.search(text)
+    if match:
+        field = "source" if match.re is FROM_CITY_PATTERN else "destination"
+        changes[field] = match.group(1).title()
+        text = CITY_PATTERN.sub(" ", text)
+
+    if not changes or any(word not in REFINEMENT_WORDS for word in re.findall(r"[a-z0-9]+", text)):
+        return None
+    return changes
+
+
+class SlotMemory:
+    def __init__(self):
+        self.slots = {}
+        self.results = []  # itineraries of the last search with these slots
+
+    def remember(self, details):
+        # details: an extraction result (complete, or its partial_data); multi-city trips are not kept
+        self.results = []
+        if (details.get("TripType") or "").lower() == "multi_city":
+            self.slots = {}
+            return
+        # A date that couldn't be resolved isn't kept, so a follow-up asks for it instead of shifting it
+        self.slots = {field: copy.deepcopy(details[field]) for field in SLOT_FIELDS
+                      if field in details and (field not in DATE_FIELDS or details[field] == "" or as_date(details[field]))}
+
+    def clear(self):
+        self.slots = {}
+        self.results = []
+
+    def merge(self, query):
+        # The details to search for this follow-up, or None if it needs the full extraction path
+        if not self.slots.get("source") and not self.slots.get("destination"):
+            return None
+        changes = parse_refinement(query, self.slots)
+        if changes is None:
+            return None
+        merged = dict(copy.deepcopy(self.slots), **changes)
+        return {field: value for field, value in merged.items() if value != ""}
+
+    def restrict_airlines(self, carriers):
+        # "only Airblue" answered from the kept results still narrows the next searches, as a merge would
+        if carriers and (self.slots.get("source") or self.slots.get("destination")):
+            self.slots["airline_detected"] = list(carriers)
+
+    def covers(self, carriers):
+        # Whether the last search included these providers (it did, unless it was limited to other airlines)
+        searched = self.slots.get("airline_detected") or []
+        return not searched or set(carriers) <= {resolve_airline(name) for name in searched}
+
+    def describe(self):
+        known = []
+        for field, value in self.slots.items():
+            if field == "Travelers":
+                value = " ".join(f"{t['Count']} {t['Type']}" for t in value if t.get("Count"))
+            if value not in ("", [], None):
+                known.append(f"{field}={value}")
+        return ", ".join(known)
@@ -0,0 +1,89 @@
+import os
+import re
+import json
+import time
+import hashlib
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Offline stand-ins for Gemini, selected with LLM_BACKEND=stub. Replies are deterministic and cost a
+# configurable latency, so the pipeline can be run and benchmarked without API keys.
+
+STUB_LLM_LATENCY = float(os.getenv("STUB_LLM_LATENCY", "0"))  # seconds per completion
+STUB_EMBEDDING_LATENCY = float(os.getenv("STUB_EMBEDDING_LATENCY", "0"))  # seconds per embedding call
+STUB_EMBEDDING_SIZE = 768  # same size as models/embedding-001
+
+QUERY_PATTERN = re.compile(r'Query:\s*"""(.*?)"""', re.DOTALL)
+
+
+def stub_extraction(query):
+    from Data_Extraction_tool import fast_parse, CITY_PATTERN, DATE_PATTERN
+    data = fast_parse(query)
+    if data is not None:
+        return data
+
+    # Unlike the fast path, ignore the words it does not understand (like an LLM would)
+    text = query.lower()
+    cities = CITY_PATTERN.findall(text)
+    dates = DATE_PATTERN.findall(text)
+    if len(cities) < 2:
+        return {"message": "This doesn't seem to be a flight-related query. Please ask something related to flights."}
+    return {"TripType": "one_way", "source": cities[0].title(), "destination": cities[1].title(),
+            "date": dates[0] if dates else "",
+            "departure_date": "", "return_date": "", "flights": [], "TravelClass": "", "Travelers": [],
+            "airline_detected": []}
+
+
+def stub_reply(prompt):
+    time.sleep(STUB_LLM_LATENCY)
+
+    # Extraction prompt (Data_Extraction_tool): answer with the same JSON Gemini would give for a simple query
+    match = QUERY_PATTERN.search(prompt)
+    if match:
+        return json.dumps(stub_extraction(match.group(1).strip()))
+
+    # Follow-up prompts (main_agent.resolve_followup, Result_Filter.filter_prompt)
+    if "NEW_QUERY" in prompt:
+        return "NEW_QUERY"
+
+    # Anything else, e.g. the ReAct agent prompt
+    return "Final Answer: The offline backend cannot answer this request."
+
+
+class StubChatModel(BaseChatModel):
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=stub_reply(prompt)))])
+
+
+class StubEmbeddings(Embeddings):
+    # Hashed bag of words: texts sharing words get nearby vectors, so follow-up lookups behave sensibly
+
+    def __init__(self, size=STUB_EMBEDDING_SIZE, latency=STUB_EMBEDDING_LATENCY):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def vector(self, text):
+        values = [0.0] * self.size
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(word.encode()).digest()
+            values[int.from_bytes(digest[:4], "little") % self.size] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in values) ** 0.5 or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.vector(text)
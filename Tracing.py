@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Lightweight spans and metrics for the agent pipeline (FAISS lookup, LLM calls, extraction, auth,
+# provider HTTP calls, formatting). Off by default; when off, span() hands back a shared no-op context
+# and count() returns immediately.
+#
+# TRACING=1             → record spans, counters and latency histograms
+# TRACING_PORT=9464     → serve /metrics (Prometheus text) and /metrics.json while the process runs
+# TRACING_EXPORT=f.json → write the JSON dump on exit
+
+ENABLED = os.getenv("TRACING", "0") != "0"
+TRACE_BUFFER = int(os.getenv("TRACING_BUFFER", "1000"))  # finished spans kept for the JSON dump
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_spans = deque(maxlen=TRACE_BUFFER)
+_span_ids = itertools.count(1)
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    # e.g. count("search_cache", result="hit")
+    if not ENABLED:
+        return
+    key = (name, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = (name, label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+@contextmanager
+def _span(name, labels):
+    span_id = next(_span_ids)
+    parent = _current.get()
+    token = _current.set(span_id)
+    start = time.perf_counter()
+    started_at = time.time()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current.reset(token)
+        observe("span_seconds", elapsed, span=name, **labels)
+        count("span_calls", span=name, **labels)
+        if error:
+            count("span_errors", span=name, **labels)
+        _spans.append({"id": span_id, "parent": parent, "name": name, "labels": labels, "start": started_at,
+                       "duration_ms": round(elapsed * 1000, 3), **({"error": error} if error else {})})
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **labels):
+    # with span("provider_http", provider="airblue"): ...
+    if not ENABLED:
+        return NOOP_SPAN
+    return _span(name, labels)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _spans.clear()
+
+
+# ---------- exporters ----------
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in _counters.items()],
+            "histograms": [{"name": name, "labels": dict(labels), "buckets": dict(zip(BUCKETS, h[:len(BUCKETS)])),
+                            "count": sum(h[:-1]), "sum": h[-1]}
+                           for (name, labels), h in _histograms.items()],
+            "spans": list(_spans)
+        }
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(h)) for key, h in _histograms.items())
+
+    for name in sorted({name for (name, _), _ in counters}):
+        lines.append(f"# TYPE flight_{name}_total counter")
+        lines.extend(f"flight_{name}_total{format_labels(labels)} {value}"
+                     for (n, labels), value in counters if n == name)
+
+    for name in sorted({name for (name, _), _ in histograms}):
+        lines.append(f"# TYPE flight_{name} histogram")
+        for (n, labels), h in histograms:
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, h):
+                cumulative += bucket
+                lines.append(f"flight_{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+            cumulative += h[len(BUCKETS)]
+            lines.append(f'flight_{name}_bucket{format_labels(labels, le="+Inf")} {cumulative}')
+            lines.append(f"flight_{name}_sum{format_labels(labels)} {h[-1]:.6f}")
+            lines.append(f"flight_{name}_count{format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def json_text():
+    return json.dumps(snapshot(), indent=2)
+
+
+# Extra formats can be plugged in here and are served at /metrics.<format>
+EXPORTERS = {"prometheus": prometheus_text, "json": json_text}
+
+
+def export(fmt="prometheus"):
+    return EXPORTERS[fmt]()
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            fmt = self.path.rpartition(".")[2] if self.path.startswith("/metrics.") else "prometheus"
+            if not self.path.startswith("/metrics") or fmt not in EXPORTERS:
+                self.send_error(404)
+                return
+            body = export(fmt).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json" if fmt == "json" else "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_export(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(export("prometheus" if path.endswith(".prom") else "json"))
+
+
+if ENABLED and os.getenv("TRACING_PORT"):
+    start_metrics_server(int(os.getenv("TRACING_PORT")))
+if ENABLED and os.getenv("TRACING_EXPORT"):
+    atexit.register(write_export, os.getenv("TRACING_EXPORT"))
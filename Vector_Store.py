@@ -0,0 +1,236 @@
+import os
+import time
+import atexit
+import threading
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+# Persistent FAISS store for past flight results.
+# Inserts are flushed to disk by a background thread (woken every N inserts, else every T seconds, and at exit),
+# stale fare results expire after a TTL, and the index is periodically rebuilt without the expired/duplicate entries.
+# Each save writes a snapshot taken under the lock, so searches are only held up for the copy, not the disk write.
+# Each save goes to a new index generation and the CURRENT pointer file is swapped atomically,
+# so a crash mid-save leaves the previous generation intact.
+# A new store stays empty (no index, no embedding call) until the first result is added.
+
+FLUSH_EVERY = int(os.getenv("VECTOR_STORE_FLUSH_EVERY", "10"))  # inserts
+FLUSH_INTERVAL = float(os.getenv("VECTOR_STORE_FLUSH_INTERVAL", "30"))  # seconds
+RESULT_TTL = float(os.getenv("VECTOR_STORE_TTL", str(6 * 3600)))  # seconds before a stored fare result is stale
+COMPACT_INTERVAL = float(os.getenv("VECTOR_STORE_COMPACT_INTERVAL", "3600"))  # seconds
+MAX_DOCUMENTS = int(os.getenv("VECTOR_STORE_MAX_DOCUMENTS", "5000"))
+
+CURRENT_FILE = "CURRENT"
+LEGACY_INDEX_NAME = "index"
+# Placeholder document older versions created the index with (no metadata, so only its text identifies it)
+LEGACY_SEED_TEXTS = {"Initial dummy flight data for FAISS index."}
+
+
+class FlightVectorStore:
+    def __init__(self, directory, embedding_model, ttl=RESULT_TTL, flush_every=FLUSH_EVERY,
+                 flush_interval=FLUSH_INTERVAL, compact_interval=COMPACT_INTERVAL, max_documents=MAX_DOCUMENTS):
+        self.directory = directory
+        self.embedding_model = embedding_model
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.max_documents = max_documents
+
+        self.lock = threading.RLock()
+        self.save_lock = threading.Lock()  # one disk write at a time (flusher thread and close)
+        self.pending = 0
+        self.last_compaction = time.time()
+        self.stop_event = threading.Event()
+        self.flush_requested = threading.Event()
+        self.flusher = None
+
+        self.store = self.load()
+        if self.store is not None and self.compact():
+            self.save()
+
+        atexit.register(self.close)
+
+    @property
+    def index(self):
+        return self.store.index if self.store is not None else None
+
+    @property
+    def size(self):
+        return self.store.index.ntotal if self.store is not None else 0
+
+    # ---------- persistence ----------
+
+    def current_index_name(self):
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                return f.read().strip()
+        if os.path.exists(os.path.join(self.directory, LEGACY_INDEX_NAME + ".faiss")):
+            return LEGACY_INDEX_NAME
+        return None
+
+    def load(self):
+        index_name = self.current_index_name()
+        if not index_name:
+            return None
+        return FAISS.load_local(self.directory, self.embedding_model, index_name=index_name,
+                                allow_dangerous_deserialization=True)
+
+    def snapshot(self):
+        # Copy of the store to write out; caller holds the lock
+        return FAISS(self.embedding_model, faiss.clone_index(self.store.index),
+                     InMemoryDocstore(dict(self.store.docstore._dict)), dict(self.store.index_to_docstore_id))
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                if self.store is None:
+                    return
+                snapshot = self.snapshot()
+                saved, self.pending = self.pending, 0
+
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                previous = self.current_index_name()
+                index_name = f"index-{time.time_ns()}"
+                snapshot.save_local(self.directory, index_name=index_name)
+
+                pointer = os.path.join(self.directory, CURRENT_FILE)
+                with open(pointer + ".tmp", "w") as f:
+                    f.write(index_name)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(pointer + ".tmp", pointer)
+            except Exception:
+                with self.lock:
+                    self.pending += saved
+                raise
+
+        if previous and previous != index_name:
+            for ext in (".faiss", ".pkl"):
+                try:
+                    os.remove(os.path.join(self.directory, previous + ext))
+                except FileNotFoundError:
+                    pass
+
+    def flush(self):
+        with self.lock:
+            if time.time() - self.last_compaction >= self.compact_interval and self.compact():
+                self.pending += 1
+            if not self.pending:
+                return
+        self.save()
+
+    def flush_loop(self):
+        while not self.stop_event.is_set():
+            self.flush_requested.wait(self.flush_interval)
+            self.flush_requested.clear()
+            if self.stop_event.is_set():
+                break
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def close(self):
+        self.stop_event.set()
+        self.flush_requested.set()
+        self.flush()
+
+    # ---------- expiry and compaction ----------
+
+    def documents(self):
+        for position, doc_id in sorted(self.store.index_to_docstore_id.items()):
+            yield position, doc_id, self.store.docstore.search(doc_id)
+
+    def is_seed(self, doc):
+        return bool(doc.metadata.get("seed")) or doc.page_content in LEGACY_SEED_TEXTS
+
+    def is_expired(self, metadata, now=None):
+        created_at = metadata.get("created_at")
+        return created_at is not None and (now or time.time()) - created_at > self.ttl
+
+    def compact(self):
+        # Rebuild the index from the stored vectors, dropping expired results, repeated queries
+        # (latest answer wins) and the oldest entries beyond max_documents. Returns True if anything changed.
+        with self.lock:
+            self.last_compaction = time.time()
+            if self.store is None:
+                return False
+            now = time.time()
+            kept = {}
+            seeds = []
+            everything = list(self.documents())
+            for position, doc_id, doc in everything:
+                if self.is_seed(doc):
+                    seeds.append((position, doc_id, doc))
+                    continue
+                if self.is_expired(doc.metadata, now):
+                    continue
+                key = (doc.metadata.get("query") or "").strip().lower() or doc_id
+                if key not in kept or doc.metadata.get("created_at", 0) >= kept[key][2].metadata.get("created_at", 0):
+                    kept[key] = (position, doc_id, doc)
+
+            survivors = sorted(kept.values(), key=lambda item: item[2].metadata.get("created_at", 0))
+            survivors = survivors[-self.max_documents:] if self.max_documents else survivors
+            # Seed documents (written by older versions to create an empty store, with or without a "seed" flag) are
+            # dropped once real results exist. FAISS can't hold zero documents, so if everything expired keep the newest (queries skip it anyway)
+            if not survivors:
+                survivors = seeds[:1] or everything[-1:]
+            if len(survivors) == len(everything):
+                return False
+
+            text_embeddings = [(doc.page_content, self.store.index.reconstruct(int(position)).tolist())
+                               for position, _, doc in survivors]
+            self.store = FAISS.from_embeddings(
+                text_embeddings, self.embedding_model,
+                metadatas=[doc.metadata for _, _, doc in survivors],
+                ids=[doc_id for _, doc_id, _ in survivors]
+            )
+            return True
+
+    # ---------- vector store API used by main_agent ----------
+
+    def add_texts(self, texts, metadatas=None, embedding_texts=None):
+        # embedding_texts: index each text under the embedding of another string (e.g. the user query,
+        # whose embedding is already cached from the similarity search) instead of embedding the text itself
+        metadatas = [dict(m, created_at=time.time()) for m in (metadatas or [{} for _ in texts])]
+        if embedding_texts:
+            vectors = [self.embedding_model.embed_query(text) for text in embedding_texts]
+        else:
+            vectors = self.embedding_model.embed_documents(list(texts))
+        with self.lock:
+            if self.store is None:
+                self.store = FAISS.from_embeddings(list(zip(texts, vectors)), self.embedding_model, metadatas=metadatas)
+                ids = list(self.store.index_to_docstore_id.values())
+            else:
+                ids = self.store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+            self.pending += len(texts)
+            if self.pending >= self.flush_every:
+                self.flush_requested.set()  # written by the flusher thread, not on the caller's
+
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+                self.flusher.start()
+        return ids
+
+    def similarity_search_with_score(self, query, k=4, filter=None, fetch_k=20, **kwargs):
+        now = time.time()
+
+        def live(metadata):
+            if self.is_expired(metadata, now):
+                return False
+            return filter(metadata) if filter else True
+
+        if self.store is None:
+            return []
+        # The query embedding may be a remote call, so it happens outside the lock like in add_texts
+        vector = self.embedding_model.embed_query(query)
+        with self.lock:
+            return self.store.similarity_search_with_score_by_vector(vector, k=k, filter=live, fetch_k=fetch_k,
+                                                                     **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
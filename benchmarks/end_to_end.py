@@ -0,0 +1,124 @@
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Mock_Bookme_Server import start_mock_server
+
+# End-to-end latency against the local mock Bookme API and the offline LLM/embedding backend (Stub_Backends.py).
+# Reports p50/p95 latency and throughput for authenticate, search_flights, extract_flight_details and a full
+# main_agent turn. Nothing leaves the machine, so runs are comparable between commits.
+# Usage: python benchmarks/end_to_end.py --delay default=0.2 --error-rate airsial=0.1 --llm-latency 0.4
+
+QUERY = "karachi to islamabad on 12 july 2 adults economy"
+SLOW_QUERY = "need a seat from karachi to islamabad on 12 july, morning if possible"  # misses the fast path
+SEARCH_INPUT = {
+    "data": {
+        "source": "Karachi",
+        "destination": "Islamabad",
+        "date": "2025-07-12",
+        "TripType": "one_way",
+        "TravelClass": "economy"
+    }
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(name, call, rounds, workers, setup=None):
+    def timed(i):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        call(i)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        timings = list(executor.map(timed, range(rounds)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{name:>24}: p50 {percentile(timings, 50) * 1000:8.1f} ms | p95 {percentile(timings, 95) * 1000:8.1f} ms | "
+          f"{rounds / elapsed:8.1f} ops/s")
+
+
+def parse_pairs(items):
+    return {k: float(v) for k, v in (item.split("=", 1) for item in items)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", action="append", default=[], metavar="PROVIDER=SECONDS")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="PROVIDER=RATE")
+    parser.add_argument("--flights", type=int, default=2, help="itineraries per provider (response size)")
+    parser.add_argument("--auth-delay", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM seconds per completion")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="stub embedding seconds per call")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="calls in flight at once")
+    parser.add_argument("--trace", action="store_true", help="enable Tracing and print the span metrics at the end")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(parse_pairs(args.delay) or {"default": 0.2},
+                                         error_rates=parse_pairs(args.error_rate), flights_per_leg=args.flights,
+                                         auth_delay=args.auth_delay, require_auth=True)
+
+    # Everything below reads its settings at import time
+    workdir = tempfile.mkdtemp(prefix="flight-bench-")
+    os.environ.update({
+        "BOOKME_BASE_URL": base_url,
+        "LLM_BACKEND": "stub",
+        "STUB_LLM_LATENCY": str(args.llm_latency),
+        "STUB_EMBEDDING_LATENCY": str(args.embedding_latency),
+        "VECTOR_STORE_DIR": os.path.join(workdir, "flight_cache"),
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+        "SEARCH_CACHE_DIR": "",
+        "TRACING": "1" if args.trace else "0"
+    })
+
+    import Data_Extraction_tool
+    from Authentication_Tool import authenticate, invalidate_token
+    from Flight_Searching_Tool import search_flights
+    from Search_Cache import search_cache
+
+    print(f"mock Bookme API at {base_url}, {args.rounds} rounds, {args.workers} worker(s)\n")
+
+    measure("authenticate (cold)", lambda i: authenticate(""), args.rounds, 1, setup=invalidate_token)
+    measure("authenticate (cached)", lambda i: authenticate(""), args.rounds, args.workers)
+
+    measure("search_flights", lambda i: search_flights({**SEARCH_INPUT, "token": ""}), args.rounds, args.workers,
+            setup=search_cache.clear)
+    measure("search_flights (cached)", lambda i: search_flights({**SEARCH_INPUT, "token": ""}), args.rounds,
+            args.workers)
+
+    measure("extract (fast path)", lambda i: Data_Extraction_tool.extract_flight_details(QUERY), args.rounds,
+            args.workers)
+    measure("extract (LLM)", lambda i: Data_Extraction_tool.extract_flight_details(SLOW_QUERY), args.rounds,
+            args.workers)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main_agent
+
+    def turn(i):
+        # A different date per round, so every turn is a new query rather than a follow-up
+        with contextlib.redirect_stdout(io.StringIO()):
+            main_agent.run_turn(f"karachi to islamabad on {1 + i % 28} august", [])
+
+    measure("main_agent turn", turn, args.rounds, 1, setup=search_cache.clear)
+
+    if args.trace:
+        import Tracing
+        print("\n" + Tracing.export("prometheus"))
+    from Provider_Health import provider_health
+    print(f"\nmock server: {server.stats}")
+    print(f"provider health: {provider_health.stats()}")
+    server.shutdown()
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Cold-start cost of the entry points, each measured in a fresh interpreter.
+# "import" only imports the module; "first use" also builds the LLM, embeddings and vector store
+# (with the offline stub backend, so no network or API key is needed).
+# Usage: python benchmarks/import_time.py --rounds 5
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("import main_agent", "import main_agent"),
+    ("import Flight_Pipeline", "import Flight_Pipeline"),
+    ("import Batch_Runner", "import Batch_Runner"),
+    ("main_agent first use", "import main_agent; main_agent.get_llm(); main_agent.get_vector_store()"),
+]
+
+
+def cold_start(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="flight-import-")
+    env = dict(os.environ, LLM_BACKEND="stub", VECTOR_STORE_DIR=os.path.join(workdir, "flight_cache"),
+               EMBEDDING_CACHE_DIR=os.path.join(workdir, "embedding_cache"))
+
+    baseline = min(cold_start("pass", env) for _ in range(args.rounds))
+    print(f"{'interpreter startup':>24}: {baseline * 1000:8.1f} ms")
+    for name, code in CASES:
+        timings = sorted(cold_start(code, env) for _ in range(args.rounds))
+        print(f"{name:>24}: median {timings[len(timings) // 2] * 1000:8.1f} ms | min {timings[0] * 1000:8.1f} ms")
+
+    # Where the import time goes (python -X importtime, top-level modules of this project)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main_agent"], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit() and os.path.exists(os.path.join(ROOT, parts[2].strip() + ".py")):
+            rows.append((int(parts[1]), parts[2].strip()))
+    print("\ncumulative import time of project modules (main_agent):")
+    for micros, module in sorted(rows, reverse=True)[:10]:
+        print(f"{module:>24}: {micros / 1000:8.1f} ms")
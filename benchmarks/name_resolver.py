@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+from difflib import get_close_matches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from IATA_Code import AIRLINE_NAMES, CITY_TO_IATA
+from Name_Resolver import resolve_airline, resolve_city
+
+# Microbenchmark: precompiled Name_Resolver indexes vs rebuilding a name map and running difflib per call.
+# Usage: python benchmarks/name_resolver.py [rounds]
+
+AIRLINE_INPUTS = ["PIA", "Air Blue", "airblu", "Serene Air", "Fly-jinnah", "fly jinah", "AirSial", "emirates"]
+CITY_INPUTS = ["Karachi", "Isloamabad", "lahor", "Rahim Yar Khan", "peshwar", "Skardu", "KHI", "nowhere"]
+
+
+def difflib_airline(user_input):
+    # The previous get_airline_code implementation
+    name_map = {k.lower(): v for k, v in AIRLINE_NAMES.items()}
+    match = get_close_matches(user_input.strip().lower(), name_map.keys(), n=1, cutoff=0.9)
+    return name_map[match[0]] if match else ""
+
+
+def difflib_city(user_input):
+    names = {k.replace("_", " "): v for k, v in CITY_TO_IATA.items()}
+    match = get_close_matches(user_input.strip().lower(), names.keys(), n=1, cutoff=0.8)
+    return names[match[0]] if match else None
+
+
+def timed(func, inputs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for value in inputs:
+            func(value)
+    return (time.perf_counter() - start) / (rounds * len(inputs)) * 1e6
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for label, inputs, old, new in (("airline", AIRLINE_INPUTS, difflib_airline, resolve_airline),
+                                    ("city", CITY_INPUTS, difflib_city, resolve_city)):
+        baseline = timed(old, inputs, rounds)
+        new.cache_clear()
+        cold = timed(new.__wrapped__, inputs, rounds)
+        memo = timed(new, inputs, rounds)
+        print(f"{label:>8}: difflib {baseline:8.2f} us/call | index {cold:8.2f} us/call | memoized {memo:6.2f} us/call")
@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Mock_Bookme_Server import start_mock_server
+
+# Compares sequential vs concurrent provider fan-out against the local mock search API.
+# A burst of identical concurrent searches shows how many upstream calls single-flight coalescing saves.
+# Usage: python benchmarks/search_fanout.py --delay airblue=0.8 --delay default=0.3 --deadline 1.0 --burst 20
+
+QUERY = {
+    "token": "benchmark",
+    "data": {
+        "source": "Karachi",
+        "destination": "Islamabad",
+        "date": "2025-07-12",
+        "TripType": "one_way",
+        "TravelClass": "economy"
+    }
+}
+
+
+def run(mode, rounds, deadline):
+    import Http_Client
+    import Flight_Searching_Tool
+    from Search_Cache import search_cache
+    Http_Client.reset_session()
+    timings = []
+    output = ""
+    for _ in range(rounds):
+        search_cache.clear()  # measure the providers, not the result cache
+        start = time.perf_counter()
+        output = Flight_Searching_Tool.search_flights(dict(QUERY, data=dict(QUERY["data"])), mode=mode, deadline=deadline)
+        timings.append(time.perf_counter() - start)
+    return timings, output, Http_Client.client_stats()
+
+
+def burst(server, users, coalesce):
+    # `users` identical searches at the same moment, against an empty result cache
+    import Flight_Searching_Tool
+    from Search_Cache import search_cache, single_flight
+    search_cache.clear()
+    single_flight.enabled = coalesce
+    before = server.stats["search"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(lambda _: Flight_Searching_Tool.search_flights(dict(QUERY, data=dict(QUERY["data"]))), range(users)))
+    return time.perf_counter() - start, server.stats["search"] - before
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", action="append", default=[], metavar="PROVIDER=SECONDS")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--deadline", type=float, default=None)
+    parser.add_argument("--burst", type=int, default=20, help="concurrent identical searches")
+    args = parser.parse_args()
+
+    delays = {k: float(v) for k, v in (item.split("=", 1) for item in args.delay)} or {"default": 0.2}
+    server, base_url = start_mock_server(delays)
+    os.environ["BOOKME_BASE_URL"] = base_url
+
+    for mode in ("sequential", "concurrent"):
+        timings, output, stats = run(mode, args.rounds, args.deadline)
+        timed_out = output.count("timed out")
+        print(f"{mode:>10}: mean {sum(timings) / len(timings) * 1000:8.1f} ms | "
+              f"min {min(timings) * 1000:8.1f} ms | max {max(timings) * 1000:8.1f} ms | "
+              f"timed out providers: {timed_out}")
+        print(f"{'':>10}  http: {stats['requests']} requests, {stats['connections_opened']} connections opened, "
+              f"{stats['connections_reused']} reused, {stats['retries']} retries")
+
+    # Time to first result with the streaming API
+    import Flight_Searching_Tool
+    from Search_Cache import search_cache
+    search_cache.clear()
+    start = time.perf_counter()
+    stream = Flight_Searching_Tool.iter_search_flights(dict(QUERY, data=dict(QUERY["data"])), deadline=args.deadline)
+    next(stream)
+    first = time.perf_counter() - start
+    list(stream)
+    print(f"{'streaming':>10}: first result after {first * 1000:8.1f} ms, all results after "
+          f"{(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    for coalesce in (False, True):
+        elapsed, upstream = burst(server, args.burst, coalesce)
+        label = "coalesced" if coalesce else "separate"
+        print(f"{label:>10}: {args.burst} concurrent searches → {upstream} upstream calls in {elapsed * 1000:8.1f} ms")
+
+    server.shutdown()
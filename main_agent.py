@@ -2,203 +2,437 @@ import os
 import json
 import warnings
 import logging
+import threading
 from dotenv import load_dotenv
-from langchain.agents import AgentType, Tool, initialize_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
-import google.generativeai as genai
-from Data_Extraction_tool import extract_flight_details
+
+# Load environment variables before the project modules below read their settings at import time
+load_dotenv()
+
+from Data_Extraction_tool import extract_flight_details, CITY_PATTERN, DATE_PATTERN
+from Date import resolve_date
+from IATA_Code import CITY_TO_IATA
+from Name_Resolver import resolve_city
 from Authentication_Tool import authenticate
-from Flight_Searching_Tool import search_flights
-import os
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain.schema import Document
+from Flight_Searching_Tool import iter_search_records, search_flights
+from Flight_Pipeline import search_details, calendar_details, flexible_days, missing_fields, stage
+from Flight_Records import (SearchOutcome, render_search, render_provider_result,
+                            render_verdict, render_fare_calendar, to_compact, from_compact)
+from Tracing import span
+from Slot_Memory import SlotMemory
+from Result_Filter import parse_filters, filter_prompt, filters_from_json, apply_filters, render_filtered
+
+# LangChain, Gemini and FAISS are imported and built on first use (see the get_* functions below),
+# so importing this module is fast and makes no network calls.
 
 
 # Suppress warnings and logs
 warnings.filterwarnings("ignore")
 logging.getLogger().setLevel(logging.CRITICAL)
 
-# Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Per-stage pipeline latencies, e.g. PIPELINE_LOG_LEVEL=INFO
+pipeline_logger = logging.getLogger("flight_pipeline")
+pipeline_logger.setLevel(os.getenv("PIPELINE_LOG_LEVEL", "CRITICAL").upper())
+pipeline_logger.addHandler(logging.StreamHandler())
+pipeline_logger.propagate = False
+
+# Well-formed queries go extraction → cached token → search directly; the agent is only a fallback
+DIRECT_PIPELINE = os.getenv("DIRECT_PIPELINE", "1") != "0"
+
+# LLM_BACKEND=stub runs everything offline against Stub_Backends.py (no API keys needed)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "flight_cache")
+
+
+def lazy(build):
+    # Builds the object on the first call (once, even with concurrent callers) and returns it afterwards
+    lock = threading.Lock()
+    built = []
+
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(build())
+        return built[0]
+
+    return get
+
+
+@lazy
+def get_llm():
+    if LLM_BACKEND == "stub":
+        from Stub_Backends import StubChatModel
+        return StubChatModel()
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash",
+        temperature=0,
+        convert_system_message_to_human=True,
+        google_api_key=os.getenv("GEMINI_API_KEY")
+    )
+
+
+@lazy
+def get_embedding_model():
+    # Gemini Embeddings (cached by content hash, see Embedding_Cache.py)
+    from Embedding_Cache import CachedEmbeddings
+    if LLM_BACKEND == "stub":
+        from Stub_Backends import StubEmbeddings
+        return CachedEmbeddings(StubEmbeddings())
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return CachedEmbeddings(
+        GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=os.getenv("GEMINI_API_KEY"))
+    )
 
-# Setup LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    temperature=0,
-    convert_system_message_to_human=True,
-    google_api_key=os.getenv("GEMINI_API_KEY")
-)
 
+@lazy
+def get_vector_store():
+    # Load or create FAISS vector store (persisted in the background, see Vector_Store.py)
+    from Vector_Store import FlightVectorStore
+    return FlightVectorStore(VECTOR_STORE_DIR, get_embedding_model())
 
-# Gemini Embeddings
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=os.getenv("GEMINI_API_KEY"))
 
-# Load or create FAISS vector store
-# Required for creating a dummy document
+# State of the turn running on this thread: where its output goes (print for the CLI, a session stream in
+# Session_Server.py) and the typed result of the search tool's latest call, so it can be stored without
+# re-parsing text. Per thread, so concurrent turns never see each other's results.
+turn_state = threading.local()
 
-VECTOR_STORE_DIR = "flight_cache"
-VECTOR_STORE_PATH = os.path.join(VECTOR_STORE_DIR, "index.faiss")
 
-if os.path.exists(VECTOR_STORE_PATH):
-    vector_store = FAISS.load_local(VECTOR_STORE_DIR, embedding_model, allow_dangerous_deserialization=True)
+def emit(text):
+    output = getattr(turn_state, "output", None)
+    if output is None:
+        print(text, flush=True)
+    else:
+        output(text)
 
-else:
-    # You can replace this dummy document later with real data
-    sample_doc = Document(page_content="Initial dummy flight data for FAISS index.")
-    vector_store = FAISS.from_documents([sample_doc], embedding_model)
-    vector_store.save_local(VECTOR_STORE_DIR)
 
+def print_result(result):
+    text = render_provider_result(result)
+    if text:
+        emit(text)
 
 
-# Tools
-tools = [
-    Tool(name="extract_details", func=extract_flight_details, description="First tool for ANY user query. Extracts flight details OR returns special responses for non-flight/abusive queries. ALWAYS return its output directly if it contains 'message' key."),
-    Tool(name="auth", func=authenticate, description="Generates Bearer token for Bookme."),
-    Tool(name="search", func=search_flights, description="Searches flights using token and extracted data.", return_direct=True)
-]
+def search_tool(input_dict):
+    if isinstance(input_dict, str):
+        input_dict = json.loads(input_dict)
+    if int(input_dict.get("flexible_days") or 0) > 0:
+        return search_flights(input_dict)
 
-# Initialize agent
-agent = initialize_agent(
-    tools=tools,
-    llm=llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=False
-)
+    # Print each provider's flights as soon as they arrive; the verdict is printed once the search is done
+    outcome = SearchOutcome()
+    for result in iter_search_records(input_dict, outcome=outcome):
+        print_result(result)
+    turn_state.outcome = outcome
+    with span("format"):
+        return render_search(outcome)
+
+
+@lazy
+def get_agent():
+    from langchain.agents import AgentType, Tool, initialize_agent
+
+    # Tools
+    tools = [
+        Tool(name="extract_details", func=extract_flight_details, description="First tool for ANY user query. Extracts flight details OR returns special responses for non-flight/abusive queries. ALWAYS return its output directly if it contains 'message' key."),
+        Tool(name="auth", func=authenticate, description="Generates Bearer token for Bookme. The token is cached, so this step can be skipped."),
+        Tool(name="search", func=search_tool, description="Searches flights using extracted data. A cached Bookme token is used when no token is given. Add \"flexible_days\": N for a cheapest-fare calendar over +/- N days.", return_direct=True)
+    ]
+
+    # Initialize agent
+    return initialize_agent(
+        tools=tools,
+        llm=get_llm(),
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=False
+    )
 
 
 
 
 # Check if required details are present
 def validate_required_fields(data: dict) -> bool:
-    required = ["source", "destination", "date"]
-    missing = [
-        field for field in required
-        if not (data.get(field) or "").strip()
-    ]
+    missing = missing_fields(data)
     if missing:
-        print(f"Missing required details: {', '.join(missing).title()}")
-        print("Please re-enter your request with complete information.\n")
+        emit(f"Missing required details: {', '.join(missing).title()}")
+        emit("Please re-enter your request with complete information.\n")
         return False
     return True
 
 
 
 
-def build_conversation_context(history, user_query):
+def build_conversation_context(history, user_query, slots=None):
     history_text = "\n".join(
         f"User: {item['query']}\nAssistant: {item['response']}"
         for item in history[-3:]
     )
+    # The structured trip details so far, so the agent doesn't have to re-derive them from raw turns
+    known = slots.describe() if slots is not None else ""
+    if known:
+        history_text = f"Known trip details: {known}\n{history_text}"
     return f"{history_text}\nUser: {user_query}\nAssistant:"
 
 
-# Main program
-if __name__ == "__main__":
-
-    conversation_history = []  # Global list to store past turns
-    MAX_TURNS = 5  # Customize this if needed
+FOLLOWUP_CANDIDATES = int(os.getenv("FOLLOWUP_CANDIDATES", "3"))
+FOLLOWUP_FETCH_K = int(os.getenv("FOLLOWUP_FETCH_K", "20"))  # documents scanned before metadata filtering
+FOLLOWUP_MAX_DISTANCE = float(os.getenv("FOLLOWUP_MAX_DISTANCE", "0.5"))  # FAISS L2 distance; further candidates never reach the LLM
 
-    while True:
-        user_input = input("\n🛫 Enter your flight request (or type 'exit' to quit):\n> ").strip()
-        if user_input.lower() == "exit":
-            break
 
-        # STEP 1: Search for similar past result
-        results = vector_store.similarity_search(user_input, k=3)
-        found_followup = False
+def route_metadata(flight_data):
+    # Route (IATA codes) and travel dates of a search, stored with each FAISS entry
+    if flight_data.get("Locations"):
+        route = [loc.get("IATA", "") for loc in flight_data["Locations"]]
+    else:
+        route = [resolve_city(flight_data.get(key) or "") or "" for key in ("source", "destination")]
+    dates = flight_data.get("TravelingDates") or [
+        flight_data.get(key) for key in ("date", "departure_date", "return_date") if flight_data.get(key)
+    ]
+    return {"route": [code for code in route if code], "dates": list(dates)}
+
+
+def query_hints(user_input):
+    # Cities and dates mentioned in the new query, found without any LLM call
+    text = user_input.lower()
+    cities = {CITY_TO_IATA[name.replace(" ", "_")] for name in CITY_PATTERN.findall(text)}
+    dates = {resolve_date(phrase) for phrase in DATE_PATTERN.findall(text)}
+    dates.discard("Could not resolve the date.")
+    return cities, dates
+
+
+def related_filter(user_input):
+    cities, dates = query_hints(user_input)
+
+    def is_related(metadata):
+        # The dummy seed document (and anything else without a query) is never a follow-up candidate
+        if metadata.get("seed") or not metadata.get("query"):
+            return False
+        route = set(metadata.get("route") or [])
+        if cities and route and not cities <= route:
+            return False
+        past_dates = set(metadata.get("dates") or [])
+        if dates and past_dates and not dates & past_dates:
+            return False
+        return True
+
+    return is_related
+
+
+def refine_results(user_input, itineraries, spec=None):
+    # Filter and rank stored itineraries in-process; the LLM only translates phrases the rule parser misses
+    spec = spec or parse_filters(user_input)
+    if spec is None:
+        with span("llm_call", purpose="filter_params"):
+            reply = get_llm().invoke(filter_prompt(user_input))
+        spec = filters_from_json(reply.content if hasattr(reply, "content") else str(reply))
+        if spec is None:
+            return None
+    with span("filter", itineraries=len(itineraries)):
+        return render_filtered(apply_filters(itineraries, spec), spec)
+
+
+def resolve_followup(user_input):
+    with span("faiss_lookup"):
+        results = get_vector_store().similarity_search_with_score(
+            user_input, k=FOLLOWUP_CANDIDATES, fetch_k=FOLLOWUP_FETCH_K, filter=related_filter(user_input)
+        )
+    candidates = [doc for doc, distance in results if distance <= FOLLOWUP_MAX_DISTANCE]
+    if not candidates:
+        return None
+
+    # Closest past result with stored records: filtered locally, the results text never goes to the LLM
+    for doc in candidates:
+        if doc.metadata.get("records"):
+            return refine_results(user_input, from_compact(doc.metadata["records"]))
+
+    # Older entries only have the rendered text
+    past_results = []
+    for i, doc in enumerate(candidates, 1):
+        try:
+            parsed_doc = json.loads(doc.page_content)
+            old_response = parsed_doc.get("response", "")
+        except:
+            old_response = doc.page_content
+        past_results.append(f"PAST RESULT {i} (query: \"{doc.metadata.get('query', '')}\"):\n{old_response}")
+    past_results_text = "\n\n".join(past_results)
+
+    # One prompt scores every candidate, instead of one LLM round-trip per candidate
+    context_prompt = f"""
+You're a flight assistant. The user previously received these results:
+{past_results_text}
 
-        for doc in results:
-            old_query = doc.metadata.get("query")
-            try:
-                parsed_doc = json.loads(doc.page_content)
-                old_response = parsed_doc.get("response", "")
-            except:
-                old_response = doc.page_content
-
-            # STEP 2: Ask Gemini to filter old result based on this follow-up
-            context_prompt = f"""
-You're a flight assistant. The user previously received this result:
-PAST RESULT (JSON):{old_response}
 User now asks:"{user_input}"
 
             Instructions:
-            - Filter and return ONLY relevant flights.
+            - Pick the single past result that best answers the new request.
+            - Filter it and return ONLY relevant flights.
             - Use this airline mapping:
               - "Fly Jinnah" = Oneapi
               - "PIA" = Amadeus
               - "Airblue" = Airblue
-            - If no match found or not a follow-up, say "NEW_QUERY".
+            - If no past result matches or it is not a follow-up, say "NEW_QUERY".
             """
 
-            filtered = llm.invoke(context_prompt)
-            filtered_text = filtered.content if hasattr(filtered, "content") else str(filtered)
+    with span("llm_call", purpose="followup_filter", candidates=len(candidates)):
+        filtered = get_llm().invoke(context_prompt)
+    filtered_text = filtered.content if hasattr(filtered, "content") else str(filtered)
+
+    if "NEW_QUERY" in filtered_text:
+        return None
+    return filtered_text
+
+
+def run_turn(user_input, conversation_history, slots=None, output=None):
+    # One turn: result filter, slot refinement, follow-up lookup, or extraction → validation → search,
+    # then memory + FAISS.
+    # Returns the response text, or None when the user has to re-enter the request.
+    # slots: the session's SlotMemory, if any; output: called with each message instead of print
+    turn_state.output = output
+    try:
+        return handle_turn(user_input, conversation_history, slots)
+    finally:
+        turn_state.output = None
+
+
+def handle_turn(user_input, conversation_history, slots):
+    timings = {}
+
+    # "cheapest 3", "morning flights", "under 20k": filter the session's last results in-process
+    spec = parse_filters(user_input) if slots is not None and slots.results else None
+    if spec is not None and slots.covers(spec.carriers):
+        filtered_text = refine_results(user_input, slots.results, spec)
+        slots.restrict_airlines(spec.carriers)
+        emit(filtered_text)
+        conversation_history.append({"query": user_input, "response": filtered_text})
+        return filtered_text
+
+    # STEP 0: Refinements of the previous request ("make it the 14th", "only Airblue") are merged into
+    # the session's slots locally and searched directly
+    merged = slots.merge(user_input) if slots is not None else None
+    if merged is not None:
+        flight_data = data_to_validate = merged
+    else:
+        # STEP 1 + 2: Search for similar past results and let Gemini filter them in one call
+        found_followup = False
+        with stage("followup", timings):
+            filtered_text = resolve_followup(user_input)
 
-            if "NEW_QUERY" not in filtered_text:
-                print("🧠 Using filtered previous result:\n", filtered_text)
-                # Save to memory
-                conversation_history.append({
-                    "query": user_input,
-                    "response": filtered_text
-                })
+        if filtered_text:
+            emit(f"🧠 Using filtered previous result:\n {filtered_text}")
+            # Save to memory
+            conversation_history.append({
+                "query": user_input,
+                "response": filtered_text
+            })
 
-                found_followup = True
-                break
+            found_followup = True
 
         # STEP 3: If it's a new query
-        if not found_followup or vector_store.index.ntotal==0:
-            # Extract flight details
+        if found_followup and get_vector_store().size != 0:
+            return filtered_text
+
+        # Extract flight details
+        with stage("extract", timings):
             flight_data_raw = extract_flight_details(user_input)
-            try:
-                flight_data = json.loads(flight_data_raw)
+        try:
+            flight_data = json.loads(flight_data_raw)
 
-            except json.JSONDecodeError:
-                print("Couldn't understand your request. Please try again.\n")
-                continue
+        except json.JSONDecodeError:
+            emit("Couldn't understand your request. Please try again.\n")
+            return None
 
-            if "partial_data" in flight_data:
-                data_to_validate = flight_data["partial_data"]
-            else:
-                data_to_validate = flight_data
+        if "partial_data" in flight_data:
+            data_to_validate = flight_data["partial_data"]
+        else:
+            data_to_validate = flight_data
 ########### Here we are tackling the situation where if any of the details are missing in user prompt, a message is appended,and other data is in partial_data  and if all details are present a simple dicti is returned
 
-            if "message" in flight_data and "respectful" in flight_data["message"].lower():
-                print(flight_data["message"])
-                continue
-            elif "message" in flight_data:
-                print(flight_data["message"])
-
-
-
-            # Step 2: Validate required fields
-            if not validate_required_fields(data_to_validate):
-                continue
+        if "message" in flight_data and "respectful" in flight_data["message"].lower():
+            emit(flight_data["message"])
+            return None
+        elif "message" in flight_data:
+            emit(flight_data["message"])
+
+
+    # Keep what was understood, even an incomplete request, so the next turn can complete or refine it
+    if slots is not None and "error" not in flight_data and "message" not in data_to_validate:
+        slots.remember(data_to_validate)
+
+    # Step 2: Validate required fields (unparseable extractions are left to the agent)
+    if "error" not in flight_data and not validate_required_fields(data_to_validate):
+        return None
+
+    days = flexible_days(user_input)
+    if DIRECT_PIPELINE and "error" not in flight_data and days:
+        # "cheapest around 12 July": cheapest fare per day over a date window
+        calendar, _ = calendar_details(flight_data, days, timings=timings)
+        agent_response = render_fare_calendar(calendar)
+        emit(agent_response)
+        outcome = None
+    elif DIRECT_PIPELINE and "error" not in flight_data:
+        # Direct pipeline: no agent loop and no second extraction
+        outcome, _ = search_details(flight_data, on_result=print_result, timings=timings)
+        emit(render_verdict(outcome))
+        with span("format"):
+            agent_response = render_search(outcome)
+    else:
+        # Provide full conversation context
+        prompt_with_history = build_conversation_context(conversation_history, user_input, slots)
+
+        turn_state.outcome = None
+        agent_response = get_agent().run(prompt_with_history)
+        outcome = turn_state.outcome
+        if outcome is not None:
+            # Flights were already streamed by the search tool
+            emit(render_verdict(outcome))
+        else:
+            emit(f"Gemini Agent Response:\n {agent_response}")
+
+    if slots is not None:
+        slots.results = outcome.itineraries if outcome is not None else []
+
+    # Save result into memory
+    conversation_history.append({
+        "query": user_input,
+        "response": agent_response
+    })
+
+    # Also store into FAISS for future reference
+    structured_faiss_data = {
+        "query": user_input,
+        "airline_map": {
+            "Oneapi": "Fly Jinnah",
+            "Amadeus": "PIA",
+            "Airblue": "Airblue"
+        }
+    }
+    metadata = {"query": user_input, **route_metadata(data_to_validate)}
+    if outcome is not None and outcome.found:
+        # Keep compact records instead of the rendered text; it is re-rendered when needed
+        metadata["records"] = to_compact(outcome.itineraries)
+    else:
+        structured_faiss_data["response"] = agent_response
+    get_vector_store().add_texts(
+        texts=[json.dumps(structured_faiss_data)],
+        metadatas=[metadata],
+        # Index under the query embedding, already cached from this turn's similarity search
+        embedding_texts=[user_input]
+    )
+    return agent_response
 
-            # Provide full conversation context
-            prompt_with_history = build_conversation_context(conversation_history, user_input)
 
-            agent_response = agent.run(prompt_with_history)
-            print("Gemini Agent Response:\n", agent_response)
+# Main program
+if __name__ == "__main__":
 
-            # Save result into memory
-            conversation_history.append({
-                "query": user_input,
-                "response": agent_response
-            })
+    conversation_history = []  # Global list to store past turns
+    slots = SlotMemory()  # Trip details of this session, refined by follow-ups
+    MAX_TURNS = 5  # Customize this if needed
 
-            # Also store into FAISS for future reference
-            structured_faiss_data = {
-                "query": user_input,
-                "response": agent_response,
-                "airline_map": {
-                    "Oneapi": "Fly Jinnah",
-                    "Amadeus": "PIA",
-                    "Airblue": "Airblue"
-                }
-            }
-            vector_store.add_texts(
-                texts=[json.dumps(structured_faiss_data)],
-                metadatas=[{"query": user_input}]
-            )
+    while True:
+        user_input = input("\n🛫 Enter your flight request (or type 'exit' to quit):\n> ").strip()
+        if user_input.lower() == "exit":
+            break
 
+        run_turn(user_input, conversation_history, slots)